@@ -27,89 +27,33 @@ CLI
 from __future__ import annotations
 
 import argparse
-import re
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional, Sequence
 
-# --- Regexes ------------------------------------------------------------------
-
-TOKEN_ID_RE         = re.compile(r'\btoken\s+id="([^"]+)"')
-HEAD_ID_RE          = re.compile(r'\bhead-id="([^"]+)"')
-PRESENT_AFTER_RE    = re.compile(r'\bpresentation-after="([^"]*)"')
-SENTENCE_OPEN_RE    = re.compile(r'<\s*sentence\b')
-SENTENCE_CLOSE_RE   = re.compile(r'</\s*sentence\s*>')
-TOKEN_LINE_RE       = re.compile(r'<\s*token\b[^>]*?/?>')  # tolerant: <token ... /> or <token ...>
-
-# --- Small helpers ------------------------------------------------------------
-
-def get_attr(line: str, regex: re.Pattern[str]) -> Optional[str]:
-    m = regex.search(line)
-    return m.group(1) if m else None
-
-def has_attr(line: str, regex: re.Pattern[str]) -> bool:
-    return bool(regex.search(line))
-
-def leading_indent(line: str) -> str:
-    return line[: len(line) - len(line.lstrip())]
-
-def is_sentence_open(line: str) -> bool:
-    return bool(SENTENCE_OPEN_RE.search(line))
-
-def is_sentence_close(line: str) -> bool:
-    return bool(SENTENCE_CLOSE_RE.search(line))
-
-def is_token_line(line: str) -> bool:
-    return bool(TOKEN_LINE_RE.search(line))
+from _stage_io import IO_BUFFER_SIZE, mapped_lines
+from _token_lines import (
+    PRESENT_AFTER_KEY, PRESENT_AFTER_RE, TOKEN_ID_RE,
+    classify_line, find_nearest_orphan_token, get_attr, leading_indent,
+)
 
 # --- Core logic ---------------------------------------------------------------
 
-def find_nearest_orphan_token(lines: list[str], idx: int) -> Optional[int]:
-    """
-    Find the nearest token line to `idx` within the same sentence that has NO head-id.
-    Search backwards first (until <sentence ...>), then forwards (until </sentence>).
-    If both sides are candidates at equal distance, prefer the previous one.
-    Return the line index, or None if not found.
-    """
-    # Search backwards to sentence open
-    prev_idx: Optional[int] = None
-    for j in range(idx - 1, -1, -1):
-        if is_sentence_open(lines[j]):
-            break
-        if is_token_line(lines[j]) and not has_attr(lines[j], HEAD_ID_RE):
-            prev_idx = j
-            break
-
-    # Search forwards to sentence close
-    next_idx: Optional[int] = None
-    for j in range(idx + 1, len(lines)):
-        if is_sentence_close(lines[j]):
-            break
-        if is_token_line(lines[j]) and not has_attr(lines[j], HEAD_ID_RE):
-            next_idx = j
-            break
-
-    # Decide: prefer previous if equally close (or if only previous exists)
-    if prev_idx is not None and next_idx is not None:
-        if (idx - prev_idx) <= (next_idx - idx):
-            return prev_idx
-        return next_idx
-    return prev_idx if prev_idx is not None else next_idx
-
-def maybe_emit_punct(lines: list[str], i: int, current_line: str) -> Optional[str]:
+def maybe_emit_punct(lines: Sequence[bytes], classes: list[int], i: int, current_line: bytes) -> Optional[bytes]:
     """
-    If current_line qualifies, return the new punctuation token string to append;
-    otherwise return None.
+    If current_line qualifies, return the new punctuation token line (UTF-8) to
+    append; otherwise return None.
     """
     tok_id = get_attr(current_line, TOKEN_ID_RE)
-    pa_val = get_attr(current_line, PRESENT_AFTER_RE)
-    if not tok_id or pa_val is None:
+    pa_raw = get_attr(current_line, PRESENT_AFTER_RE)
+    if not tok_id or pa_raw is None:
         return None
 
     # We only act if presentation-after is a single char and not '?'
+    pa_val = pa_raw.decode("utf-8")
     if len(pa_val) != 1 or pa_val == "?":
         return None
 
-    nearest_idx = find_nearest_orphan_token(lines, i)
+    nearest_idx = find_nearest_orphan_token(classes, i)
     if nearest_idx is None:
         return None
 
@@ -117,23 +61,36 @@ def maybe_emit_punct(lines: list[str], i: int, current_line: str) -> Optional[st
     if not head_id:
         return None
 
-    indent = leading_indent(current_line)
+    indent = leading_indent(current_line).decode("utf-8")
     punct = pa_val
     # Emit exactly as per your original shape, but self-closing and normalized spacing
     return (
-        f'{indent}<token id="{tok_id}0" form="{punct}" lemma="{punct}" '
-        f'part-of-speech="PUNCT" morphology="_" head-id="{head_id}" relation="punct" />\n'
-    )
+        f'{indent}<token id="{tok_id.decode("utf-8")}0" form="{punct}" lemma="{punct}" '
+        f'part-of-speech="PUNCT" morphology="_" head-id="{head_id.decode("utf-8")}" relation="punct" />\n'
+    ).encode("utf-8")
+
+def iter_processed(lines: Sequence[bytes]) -> Iterator[bytes]:
+    """Yield `lines` (UTF-8, newline-terminated) with punctuation tokens inserted."""
+    classes = [classify_line(line) for line in lines]
+    for i, line in enumerate(lines):
+        yield line
+        # Append punctuation line if conditions match (cheap substring gate first)
+        if PRESENT_AFTER_KEY not in line:
+            continue
+        punct_line = maybe_emit_punct(lines, classes, i, line)
+        if punct_line:
+            yield punct_line
+
+def process_lines(lines: Sequence[bytes]) -> list[bytes]:
+    """In-memory variant of `process_file` (used by the fused 06–09 driver)."""
+    return list(iter_processed(lines))
 
 def process_file(input_path: Path, output_path: Path) -> None:
-    lines = input_path.read_text(encoding="utf-8").splitlines(keepends=True)
-    with output_path.open("w", encoding="utf-8") as out:
-        for i, line in enumerate(lines):
-            out.write(line)
-            # Append punctuation line if conditions match
-            punct_line = maybe_emit_punct(lines, i, line)
-            if punct_line:
-                out.write(punct_line)
+    # The input is mmap'ed and sliced per line on demand, and the output is
+    # streamed, so neither side materializes the whole file as a line list.
+    with mapped_lines(input_path) as lines, \
+         output_path.open("wb", buffering=IO_BUFFER_SIZE) as outfile:
+        outfile.writelines(iter_processed(lines))
 
 # --- CLI ---------------------------------------------------------------------
 
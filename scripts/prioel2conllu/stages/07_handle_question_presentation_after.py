@@ -35,17 +35,19 @@ from __future__ import annotations
 import argparse
 import re
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional, Sequence
+
+from _stage_io import IO_BUFFER_SIZE, mapped_lines
+from _token_lines import (
+    PRESENT_AFTER_RE, TOKEN_ID_RE,
+    classify_line, find_nearest_orphan_token, get_attr, leading_indent,
+)
 
 # --- Regexes ------------------------------------------------------------------
+# The shared patterns are in _token_lines; these two are 07's own.
 
-TOKEN_ID_RE         = re.compile(r'\btoken\s+id="([^"]+)"')
-HEAD_ID_RE          = re.compile(r'\bhead-id="([^"]+)"')
-PRESENT_AFTER_RE    = re.compile(r'\bpresentation-after="([^"]*)"')
-FORM_RE             = re.compile(r'\bform="([^"]*)"')
-SENTENCE_OPEN_RE    = re.compile(r'<\s*sentence\b')
-SENTENCE_CLOSE_RE   = re.compile(r'</\s*sentence\s*>')
-TOKEN_LINE_RE       = re.compile(r'<\s*token\b[^>]*?/?>')  # tolerant
+FORM_RE             = re.compile(rb'\bform="([^"]*)"')
+QUESTION_AFTER_KEY  = b'presentation-after="?'
 
 # Define vowels for "right-most vowel" insertion rule (adjust as needed)
 # Current set mirrors your intent: a, o, e, ē, i, ǝ
@@ -53,70 +55,22 @@ VOWELS = "aoeēiǝ"
 
 # --- Helpers ------------------------------------------------------------------
 
-def get_attr(line: str, regex: re.Pattern[str]) -> Optional[str]:
-    m = regex.search(line)
-    return m.group(1) if m else None
-
-def has_attr(line: str, regex: re.Pattern[str]) -> bool:
-    return bool(regex.search(line))
-
-def leading_indent(line: str) -> str:
-    return line[: len(line) - len(line.lstrip())]
-
-def is_sentence_open(line: str) -> bool:
-    return bool(SENTENCE_OPEN_RE.search(line))
-
-def is_sentence_close(line: str) -> bool:
-    return bool(SENTENCE_CLOSE_RE.search(line))
-
-def is_token_line(line: str) -> bool:
-    return bool(TOKEN_LINE_RE.search(line))
-
 def insert_q_after_last_vowel(text: str) -> str:
     """
     Insert '?' immediately after the right-most vowel in `text`.
     If no vowel exists, append '?' at the end.
     """
-    last_vowel_pos = -1
-    for i in range(len(text) - 1, -1, -1):
-        if text[i] in VOWELS:
-            last_vowel_pos = i
-            break
+    last_vowel_pos = max(text.rfind(v) for v in VOWELS)
     if last_vowel_pos == -1:
         return text + "?"
     return text[: last_vowel_pos + 1] + "?" + text[last_vowel_pos + 1 :]
 
-def find_nearest_orphan_token(lines: list[str], idx: int) -> Optional[int]:
-    """
-    Find nearest token line to `idx` in the same sentence that has NO head-id.
-    Prefer previous if distance ties. Do not cross sentence boundaries.
-    """
-    prev_idx: Optional[int] = None
-    for j in range(idx - 1, -1, -1):
-        if is_sentence_open(lines[j]):
-            break
-        if is_token_line(lines[j]) and not has_attr(lines[j], HEAD_ID_RE):
-            prev_idx = j
-            break
-
-    next_idx: Optional[int] = None
-    for j in range(idx + 1, len(lines)):
-        if is_sentence_close(lines[j]):
-            break
-        if is_token_line(lines[j]) and not has_attr(lines[j], HEAD_ID_RE):
-            next_idx = j
-            break
-
-    if prev_idx is not None and next_idx is not None:
-        if (idx - prev_idx) <= (next_idx - idx):
-            return prev_idx
-        return next_idx
-    return prev_idx if prev_idx is not None else next_idx
-
-def maybe_emit_before_and_after(lines: list[str], i: int, current_line: str) -> tuple[Optional[str], Optional[str]]:
+# --- Core logic ---------------------------------------------------------------
+
+def maybe_emit_before_and_after(lines: Sequence[bytes], classes: list[int], i: int, current_line: bytes) -> tuple[Optional[bytes], Optional[bytes]]:
     """
     If current line triggers on presentation-after starting with '?',
-    return (before_line, after_line) strings to emit; each may be None.
+    return (before_line, after_line) UTF-8 lines to emit; each may be None.
     """
     tok_id = get_attr(current_line, TOKEN_ID_RE)
     pa_val = get_attr(current_line, PRESENT_AFTER_RE)
@@ -125,51 +79,67 @@ def maybe_emit_before_and_after(lines: list[str], i: int, current_line: str) ->
     if not tok_id or pa_val is None:
         return None, None
 
-    if len(pa_val) == 0 or pa_val[0] != "?":
+    if not pa_val.startswith(b"?"):
         return None, None
 
-    indent = leading_indent(current_line)
+    indent = leading_indent(current_line).decode("utf-8")
+    tid = tok_id.decode("utf-8")
 
     # -------- BEFORE: interrogative-marked copy (id "<id>-<id>0") ----------
-    before_line: Optional[str] = None
+    before_line: Optional[bytes] = None
     if form is not None:
-        interrogative_form = insert_q_after_last_vowel(form)
+        interrogative_form = insert_q_after_last_vowel(form.decode("utf-8"))
         before_line = (
-            f'{indent}<token id="{tok_id}-{tok_id}0" form="{interrogative_form}" '
+            f'{indent}<token id="{tid}-{tid}0" form="{interrogative_form}" '
             f'lemma="_" part-of-speech="_" morphology="_" head-id="_" relation="_" />\n'
-        )
+        ).encode("utf-8")
 
     # -------- AFTER: punctuation token '?' attached to nearest orphan -------
-    after_line: Optional[str] = None
-    nearest_idx = find_nearest_orphan_token(lines, i)
+    after_line: Optional[bytes] = None
+    nearest_idx = find_nearest_orphan_token(classes, i)
     if nearest_idx is not None:
         head_id = get_attr(lines[nearest_idx], TOKEN_ID_RE)
         if head_id:
             after_line = (
-                f'{indent}<token id="{tok_id}0" form="?" lemma="?" '
-                f'part-of-speech="PUNCT" morphology="_" head-id="{head_id}" relation="punct" />\n'
-            )
+                f'{indent}<token id="{tid}0" form="?" lemma="?" '
+                f'part-of-speech="PUNCT" morphology="_" head-id="{head_id.decode("utf-8")}" relation="punct" />\n'
+            ).encode("utf-8")
 
     return before_line, after_line
 
 # --- Main processing ----------------------------------------------------------
 
-def process_file(input_path: Path, output_path: Path) -> None:
-    lines = input_path.read_text(encoding="utf-8").splitlines(keepends=True)
-    with output_path.open("w", encoding="utf-8") as out:
-        for i, line in enumerate(lines):
-            before, after = maybe_emit_before_and_after(lines, i, line)
+def iter_processed(lines: Sequence[bytes]) -> Iterator[bytes]:
+    """Yield `lines` (UTF-8, newline-terminated) with '?' copies/tokens inserted."""
+    classes = [classify_line(line) for line in lines]
+    for i, line in enumerate(lines):
+        # Cheap substring gate: only presentation-after="?..." can trigger.
+        if QUESTION_AFTER_KEY not in line:
+            yield line
+            continue
+        before, after = maybe_emit_before_and_after(lines, classes, i, line)
 
-            # emit BEFORE line (if any)
-            if before:
-                out.write(before)
+        # emit BEFORE line (if any)
+        if before:
+            yield before
 
-            # original line
-            out.write(line)
+        # original line
+        yield line
 
-            # emit AFTER line (if any)
-            if after:
-                out.write(after)
+        # emit AFTER line (if any)
+        if after:
+            yield after
+
+def process_lines(lines: Sequence[bytes]) -> list[bytes]:
+    """In-memory variant of `process_file` (used by the fused 06–09 driver)."""
+    return list(iter_processed(lines))
+
+def process_file(input_path: Path, output_path: Path) -> None:
+    # The input is mmap'ed and sliced per line on demand, and the output is
+    # streamed, so neither side materializes the whole file as a line list.
+    with mapped_lines(input_path) as lines, \
+         output_path.open("wb", buffering=IO_BUFFER_SIZE) as outfile:
+        outfile.writelines(iter_processed(lines))
 
 # --- CLI ---------------------------------------------------------------------
 
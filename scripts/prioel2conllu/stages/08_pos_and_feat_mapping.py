@@ -16,57 +16,24 @@ from __future__ import annotations
 
 import argparse
 import re
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional, Dict, Tuple
 
-# --------- Regexes ----------
-LEMMA_RE         = re.compile(r'\blemma="([^"]*)"')
-POS_RE           = re.compile(r'\bpart-of-speech="([^"]*)"')
-REL_RE           = re.compile(r'\brelation="([^"]*)"')
-FEAT_RE          = re.compile(r'\bFEAT="([^"]*)"')
-PRESENT_AFTER_RE = re.compile(r'\bpresentation-after="([^"]*)"')
-
-# --------- Core helpers (attribute editing) ----------
-
-def get_attr(line: str, rx: re.Pattern[str]) -> Optional[str]:
-    m = rx.search(line)
-    return m.group(1) if m else None
-
-def set_attr(line: str, name: str, value: str) -> str:
-    """Set or replace an XML-like attribute `name="..."` with `value`."""
-    if re.search(fr'\b{name}="', line):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    # Insert before '/>' or '>' if present
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
-
-def parse_feats(feats: str) -> Dict[str, str]:
-    """Parse a FEAT string like 'A=B|C=D' into a dict. '_' or '' → {}."""
-    if not feats or feats == "_":
-        return {}
-    out: Dict[str, str] = {}
-    for kv in feats.split("|"):
-        if "=" in kv:
-            k, v = kv.split("=", 1)
-            out[k] = v
-    return out
-
-def feats_to_str(d: Dict[str, str]) -> str:
-    """Serialize FEAT dict back to string; '_' if empty."""
-    if not d:
-        return "_"
-    # stable order for readability
-    return "|".join(f"{k}={d[k]}" for k in sorted(d))
-
-def merge_feats(line: str, new_feats: Dict[str, str]) -> str:
-    """Merge `new_feats` into FEAT=..., creating FEAT if missing."""
-    cur = get_attr(line, FEAT_RE)
-    cur_dict = parse_feats(cur or "")
+from _attr_utils import feats_to_str, get_attr, parse_feats, set_attr
+from _stage_io import rewrite_lines
+
+# --------- FEAT helpers ----------
+
+def merge_feats(feat: Optional[str], new_feats: Dict[str, str]) -> str:
+    """Merge `new_feats` into a FEAT value (None = attribute missing)."""
+    cur_dict = parse_feats(feat or "")
+    if feat is not None and cur_dict.items() >= new_feats.items():
+        # Nothing new to add: keep FEAT as is if it is already canonical.
+        if feats_to_str(cur_dict) == feat:
+            return feat
     cur_dict.update(new_feats)
-    return set_attr(line, "FEAT", feats_to_str(cur_dict))
+    return feats_to_str(cur_dict)
 
 # --------- Mapping table ----------
 # Instead of embedding FEAT text into the POS value, use (UPOS, extra_feats_dict).
@@ -166,121 +133,137 @@ POS_MAP: Dict[Tuple[str, Optional[str]], Tuple[str, Optional[Dict[str, str]]]] =
 }
 
 # --------- Core transformation ----------
+# The rules only ever read lemma / part-of-speech / relation / FEAT /
+# presentation-after and only ever write part-of-speech / relation / FEAT, so
+# they run on a small dict of those values. The outcome is memoized on the
+# values read: the corpus repeats the same combinations thousands of times.
 
-def apply_pos_map(line: str) -> str:
-    lemma = get_attr(line, LEMMA_RE)
-    old_pos = get_attr(line, POS_RE)
+Attrs = Dict[str, Optional[str]]
 
+def apply_pos_map(a: Attrs) -> None:
+    old_pos = a["pos"]
     if not old_pos:
-        return line
+        return
 
     # Prefer lemma-specific rule; fall back to POS-only rule.
-    key = (old_pos, lemma) if (old_pos, lemma) in POS_MAP else (old_pos, None)
+    key = (old_pos, a["lemma"]) if (old_pos, a["lemma"]) in POS_MAP else (old_pos, None)
     if key in POS_MAP:
         new_upos, extra = POS_MAP[key]
-        line = set_attr(line, "part-of-speech", new_upos)
+        a["pos"] = new_upos
         if extra:
-            line = merge_feats(line, extra)
-    return line
+            a["feat"] = merge_feats(a["feat"], extra)
 
-def handle_pr(line: str) -> str:
+def handle_pr(a: Attrs) -> None:
     """
     If POS is 'Pr', choose DET/PRON with PronType depending on presence of '?' in presentation-after.
     """
-    pos = get_attr(line, POS_RE)
-    if pos != "Pr":
-        return line
+    if a["pos"] != "Pr":
+        return
 
-    pa = get_attr(line, PRESENT_AFTER_RE) or ""
-    if "?" in pa:
+    if "?" in (a["pa"] or ""):
         # DET + PronType=Int
-        line = set_attr(line, "part-of-speech", "DET")
-        line = merge_feats(line, {"PronType": "Int"})
+        a["pos"] = "DET"
+        a["feat"] = merge_feats(a["feat"], {"PronType": "Int"})
     else:
         # PRON + PronType=Rel
-        line = set_attr(line, "part-of-speech", "PRON")
-        line = merge_feats(line, {"PronType": "Rel"})
-    return line
+        a["pos"] = "PRON"
+        a["feat"] = merge_feats(a["feat"], {"PronType": "Rel"})
 
-def handle_miayn_det(line: str) -> str:
-    if 'lemma="miayn"' in line and 'part-of-speech="ADJ"' in line and 'relation="atr"' in line:
-        line = set_attr(line, "part-of-speech", "DET")
-    return line
+def handle_miayn_det(a: Attrs) -> None:
+    if a["lemma"] == "miayn" and a["pos"] == "ADJ" and a["rel"] == "atr":
+        a["pos"] = "DET"
 
-def handle_cop_for_cxik(line: str) -> str:
-    if 'lemma="čʻikʻ"' in line:
-        # Force relation="cop"
-        m = REL_RE.search(line)
-        if m:
-            line = set_attr(line, "relation", "cop")
-    return line
+def handle_cop_for_cxik(a: Attrs) -> None:
+    # Force relation="cop" (only if a relation is present)
+    if a["lemma"] == "čʻikʻ" and a["rel"] is not None:
+        a["rel"] = "cop"
 
-def add_animacy_anim(line: str) -> str:
+def add_animacy_anim(a: Attrs) -> None:
     # lemmas that should be animate
-    if any(s in line for s in ['lemma="okʻ"', 'lemma="omn"', 'lemma="ov"', 'lemma="o"']):
-        line = merge_feats(line, {"Animacy": "Anim"})
-    return line
+    if a["lemma"] in ("okʻ", "omn", "ov", "o"):
+        a["feat"] = merge_feats(a["feat"], {"Animacy": "Anim"})
 
-def add_animacy_inan_for_pron(line: str) -> str:
-    if any(s in line for s in ['lemma="inčʻ"', 'lemma="zi"', 'lemma="zinčʻ"']) and 'part-of-speech="PRON"' in line:
-        line = merge_feats(line, {"Animacy": "Inan"})
-    return line
+def add_animacy_inan_for_pron(a: Attrs) -> None:
+    if a["lemma"] in ("inčʻ", "zi", "zinčʻ") and a["pos"] == "PRON":
+        a["feat"] = merge_feats(a["feat"], {"Animacy": "Inan"})
 
-def handle_ays_hash(line: str) -> str:
+AYS_HASH_RE = re.compile(r'ays#\d+')
+
+def handle_ays_hash(a: Attrs) -> None:
     # lemmas like ays#1, ays#2 ...
-    if re.search(r'lemma="ays#\d+"', line):
+    if a["lemma"] is not None and AYS_HASH_RE.fullmatch(a["lemma"]):
         # Force DET and replace FEAT entirely with PronType=Dem (matches original behavior)
-        line = set_attr(line, "part-of-speech", "DET")
-        if FEAT_RE.search(line):
-            line = re.sub(r'(FEAT=")[^"]*(")', r'\1PronType=Dem\2', line, count=1)
-        else:
-            line = set_attr(line, "FEAT", "PronType=Dem")
-    return line
+        a["pos"] = "DET"
+        a["feat"] = "PronType=Dem"
+
+def add_definite_spec_for_omn(a: Attrs) -> None:
+    if a["lemma"] == "omn":
+        a["feat"] = merge_feats(a["feat"], {"Definite": "Spec"})
+
+def add_definite_ind_for_ok(a: Attrs) -> None:
+    if a["lemma"] == "okʻ":
+        a["feat"] = merge_feats(a["feat"], {"Definite": "Ind"})
+
+@lru_cache(maxsize=1 << 16)
+def map_attrs(
+    lemma: Optional[str], pos: Optional[str], rel: Optional[str],
+    feat: Optional[str], pa_question: bool,
+) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """Run all rules; return the resulting (part-of-speech, relation, FEAT)."""
+    a: Attrs = {"lemma": lemma, "pos": pos, "rel": rel, "feat": feat,
+                "pa": "?" if pa_question else ""}
 
-def add_definite_spec_for_omn(line: str) -> str:
-    if 'lemma="omn"' in line:
-        line = merge_feats(line, {"Definite": "Spec"})
-    return line
-
-def add_definite_ind_for_ok(line: str) -> str:
-    if 'lemma="okʻ"' in line:
-        line = merge_feats(line, {"Definite": "Ind"})
-    return line
-
-def transform_line(line: str) -> str:
     # 1) table-driven POS/FEAT mapping
-    line = apply_pos_map(line)
+    apply_pos_map(a)
 
     # 2) special 'Pr' logic (DET/PRON + PronType=Int/Rel)
-    line = handle_pr(line)
+    handle_pr(a)
 
     # 3) special lexical tweaks
-    line = handle_miayn_det(line)
-    line = handle_cop_for_cxik(line)
-    line = add_animacy_anim(line)
-    line = add_animacy_inan_for_pron(line)
-    line = handle_ays_hash(line)
-    line = add_definite_spec_for_omn(line)
-    line = add_definite_ind_for_ok(line)
+    handle_miayn_det(a)
+    handle_cop_for_cxik(a)
+    add_animacy_anim(a)
+    add_animacy_inan_for_pron(a)
+    handle_ays_hash(a)
+    add_definite_spec_for_omn(a)
+    add_definite_ind_for_ok(a)
 
+    return a["pos"], a["rel"], a["feat"]
+
+def transform_line(line: str) -> str:
+    pos = get_attr(line, "part-of-speech")
+    rel = get_attr(line, "relation")
+    feat = get_attr(line, "FEAT")
+    pa = get_attr(line, "presentation-after") if pos == "Pr" else None
+    new_pos, new_rel, new_feat = map_attrs(
+        get_attr(line, "lemma"), pos, rel, feat, pa is not None and "?" in pa,
+    )
+
+    # Write back in rule order: an inserted part-of-speech precedes an inserted FEAT.
+    if new_pos != pos:
+        line = set_attr(line, "part-of-speech", new_pos)
+    if new_rel != rel:
+        line = set_attr(line, "relation", new_rel)
+    if new_feat != feat:
+        line = set_attr(line, "FEAT", new_feat)
     return line
 
 # --------- File I/O & CLI ----------
 
-def process_file(input_path: Path, output_path: Path) -> None:
-    with input_path.open("r", encoding="utf-8") as infile, output_path.open("w", encoding="utf-8") as outfile:
-        for raw in infile:
-            line = raw.rstrip("\n")
-            out = transform_line(line)
-            # ensure a newline (mirrors your original behavior)
-            outfile.write(out if out.endswith("\n") else out + "\n")
+def process_file(input_path: Path, output_path: Path, jobs: int = 1) -> None:
+    """
+    Transform every line of `input_path`. `transform_line` is pure per line, so
+    with jobs != 1 the lines are fanned out to a process pool (0 = all cores).
+    """
+    rewrite_lines(input_path, output_path, transform_line, jobs)
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Stage 08: rule-based POS mapping and FEAT injection.")
     ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
     ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes (0 = all cores; default 1)")
     args = ap.parse_args()
-    process_file(args.inp, args.out)
+    process_file(args.inp, args.out, jobs=args.jobs)
 
 if __name__ == "__main__":
     main()
@@ -24,42 +24,13 @@ from __future__ import annotations
 
 import argparse
 import re
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Optional
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
 
-# ---------- Attribute helpers ----------
-
-def get_attr(line: str, name: str) -> Optional[str]:
-    m = re.search(fr'\b{name}="([^"]*)"', line)
-    return m.group(1) if m else None
-
-def set_attr(line: str, name: str, value: str) -> str:
-    """Set or replace XML-like attribute name="value" on a token line."""
-    if re.search(fr'\b{name}="', line):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    # Insert before '/>' or '>' if present
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
-
-def remove_attr(line: str, name: str) -> str:
-    """Remove an attribute entirely (first occurrence)."""
-    return re.sub(fr'\s*\b{name}="[^"]*"', "", line, count=1)
-
-def parse_feats(s: Optional[str]) -> Dict[str, str]:
-    if not s or s == "_":
-        return {}
-    out: Dict[str, str] = {}
-    for kv in s.split("|"):
-        if "=" in kv:
-            k, v = kv.split("=", 1)
-            out[k] = v
-    return out
-
-def feats_to_str(d: Dict[str, str]) -> str:
-    return "_" if not d else "|".join(f"{k}={d[k]}" for k in sorted(d))
+from _attr_utils import feats_to_str, parse_feats
+from _stage_io import rewrite_lines
 
 # ---------- Mapping tables (as given) ----------
 
@@ -84,71 +55,111 @@ MORPH_MAP_6 = {
     'g': 'Case=Gen', 'b': 'Case=Abl', 'l': 'Case=Loc'
 }
 
-def expand_morph_codes(code: str) -> Dict[str, str]:
+# Parsed views of the tables above, built once at import so that
+# `expand_morph_codes` never splits "Key=Value" strings per token.
+
+def _parse_spec(spec: str) -> Tuple[Tuple[str, str], ...]:
+    """'A=B|C=D' -> (('A', 'B'), ('C', 'D'))."""
+    return tuple((k, v) for k, _, v in (kv.partition("=") for kv in spec.split("|")))
+
+_MORPH_0 = {c: _parse_spec(s) for c, s in MORPH_MAP_0.items()}
+_MORPH_1 = {c: _parse_spec(s) for c, s in MORPH_MAP_1.items()}
+_MORPH_2 = {c: _parse_spec(s) for c, s in MORPH_MAP_2.items()}
+_MORPH_4 = {c: _parse_spec(s) for c, s in MORPH_MAP_4.items()}
+_MORPH_6 = {c: _parse_spec(s) for c, s in MORPH_MAP_6.items()}
+
+@lru_cache(maxsize=4096)
+def expand_morph_codes(code: str) -> Mapping[str, str]:
     """
-    Expand the compact morphology string into a FEAT dict.
-    Returns a dict of {FeatName: Value}.
+    Expand the compact morphology string into FEAT pairs.
+    Returns a read-only mapping of {FeatName: Value}.
+
+    Results are cached per code (a corpus only has a few hundred distinct
+    codes), so the mapping is shared between callers and wrapped in a
+    MappingProxyType to keep it from being modified.
     """
     feats: Dict[str, str] = {}
 
     # idx 0,1 (single chars)
-    if len(code) > 0 and code[0] in MORPH_MAP_0:
-        k, v = MORPH_MAP_0[code[0]].split("="); feats[k] = v
-    if len(code) > 1 and code[1] in MORPH_MAP_1:
-        k, v = MORPH_MAP_1[code[1]].split("="); feats[k] = v
+    if len(code) > 0 and code[0] in _MORPH_0:
+        feats.update(_MORPH_0[code[0]])
+    if len(code) > 1 and code[1] in _MORPH_1:
+        feats.update(_MORPH_1[code[1]])
 
     # idx 2..3 (two chars)
-    if len(code) > 3:
-        vf = code[2:4]
-        if vf in MORPH_MAP_2:
-            for kv in MORPH_MAP_2[vf].split("|"):
-                k, v = kv.split("=", 1); feats[k] = v
+    if len(code) > 3 and code[2:4] in _MORPH_2:
+        feats.update(_MORPH_2[code[2:4]])
 
     # idx 4 (voice)
-    if len(code) > 4 and code[4] in MORPH_MAP_4:
-        k, v = MORPH_MAP_4[code[4]].split("="); feats[k] = v
+    if len(code) > 4 and code[4] in _MORPH_4:
+        feats.update(_MORPH_4[code[4]])
 
     # idx 6 (case)
-    if len(code) > 6 and code[6] in MORPH_MAP_6:
-        k, v = MORPH_MAP_6[code[6]].split("="); feats[k] = v
+    if len(code) > 6 and code[6] in _MORPH_6:
+        feats.update(_MORPH_6[code[6]])
 
-    return feats
+    return MappingProxyType(feats)
 
 # ---------- Core transform ----------
 
-def transform_line(line: str) -> str:
-    morph = get_attr(line, "morphology")
-    if morph is None:
-        return line
+# The hot path only ever touches two attributes, so their patterns are compiled
+# once here instead of being rebuilt from f-strings on every call.
+MORPH_RE      = re.compile(r'\bmorphology="([^"]*)"')
+MORPH_DEL_RE  = re.compile(r'\s*\bmorphology="[^"]*"')
+FEAT_RE       = re.compile(r'\bFEAT="([^"]*)"')
+FEAT_SPAN_RE  = re.compile(r'FEAT="([^"]*)"')     # first FEAT="..." (not boundary-checked)
+SELF_CLOSE_RE = re.compile(r'\s*/>')
+
+def _set_feat(line: str, value: str) -> str:
+    """Set or replace FEAT="value" on a token line, inserting it before '/>' or '>'."""
+    if FEAT_RE.search(line) is not None:
+        m = FEAT_SPAN_RE.search(line)
+        return line[:m.start(1)] + value + line[m.end(1):]
+    if "/>" in line:
+        return SELF_CLOSE_RE.sub(f' FEAT="{value}" />', line, count=1)
+    if ">" in line:
+        return line.replace(">", f' FEAT="{value}">', 1)
+    return f'{line} FEAT="{value}"'
 
-    produced = expand_morph_codes(morph)
+@lru_cache(maxsize=1 << 16)
+def merge_morph_into_feat(feat: Optional[str], morph: str) -> str:
+    """New FEAT value for a token with FEAT=`feat` (None = absent) and `morph`."""
+    cur = parse_feats(feat)
+    cur.update(expand_morph_codes(morph))
+    return feats_to_str(cur)
 
-    # Merge into FEAT
-    cur = parse_feats(get_attr(line, "FEAT"))
-    cur.update(produced)
-    new_feat_str = feats_to_str(cur)
+def transform_line(line: str) -> str:
+    m = MORPH_RE.search(line)
+    if m is None:
+        return line
 
-    line = set_attr(line, "FEAT", new_feat_str)
+    # Merge into FEAT (memoized: (FEAT, morphology) pairs repeat heavily)
+    f = FEAT_RE.search(line)
+    feat = f.group(1) if f is not None else None
+    new_feat_str = merge_morph_into_feat(feat, m.group(1))
+    # Skip the rewrite when the merge changes nothing (e.g. morphology="_").
+    if new_feat_str != feat:
+        line = _set_feat(line, new_feat_str)
 
     # Remove morphology attribute regardless (normalize)
-    line = remove_attr(line, "morphology")
-
-    return line
+    return MORPH_DEL_RE.sub("", line, count=1)
 
 # ---------- File I/O & CLI ----------
 
-def process_file(input_path: Path, output_path: Path) -> None:
-    with input_path.open("r", encoding="utf-8") as infile, output_path.open("w", encoding="utf-8") as outfile:
-        for raw in infile:
-            out = transform_line(raw.rstrip("\n"))
-            outfile.write(out if out.endswith("\n") else out + "\n")
+def process_file(input_path: Path, output_path: Path, jobs: int = 1) -> None:
+    """
+    Transform every line of `input_path`. `transform_line` is pure per line, so
+    with jobs != 1 the lines are fanned out to a process pool (0 = all cores).
+    """
+    rewrite_lines(input_path, output_path, transform_line, jobs)
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Stage 09: expand morphology codes to UD FEATS.")
     ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
     ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes (0 = all cores; default 1)")
     args = ap.parse_args()
-    process_file(args.inp, args.out)
+    process_file(args.inp, args.out, jobs=args.jobs)
 
 if __name__ == "__main__":
     main()
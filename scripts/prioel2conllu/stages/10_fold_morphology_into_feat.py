@@ -21,29 +21,12 @@ CLI
 from __future__ import annotations
 
 import argparse
-import re
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 
-# --- Attribute helpers --------------------------------------------------------
-
-def get_attr(line: str, name: str) -> Optional[str]:
-    m = re.search(fr'\b{name}="([^"]*)"', line)
-    return m.group(1) if m else None
-
-def set_attr(line: str, name: str, value: str) -> str:
-    """Set or replace XML-like attribute name="value"."""
-    if re.search(fr'\b{name}="', line):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
-
-def remove_attr(line: str, name: str) -> str:
-    """Remove the first occurrence of an attribute entirely."""
-    return re.sub(fr'\s*\b{name}="[^"]*"', "", line, count=1)
+from _attr_utils import remove_attr, set_attr, value_start
+from _stage_io import IO_BUFFER_SIZE
 
 # --- Core logic ---------------------------------------------------------------
 
@@ -53,6 +36,8 @@ def normalize_feat_value(val: Optional[str]) -> str:
         return ""
     return val.strip("| ")
 
+# FEAT/morphology pairs repeat heavily across a corpus
+@lru_cache(maxsize=1 << 16)
 def combine_feat_and_morph(feat: str, morph: str) -> str:
     """Join two feature strings with '|' (skip empties, de-duplicate pipes)."""
     feat = normalize_feat_value(feat)
@@ -62,24 +47,65 @@ def combine_feat_and_morph(feat: str, morph: str) -> str:
     return feat or morph or "_"
 
 def transform_line(line: str) -> str:
-    morph = get_attr(line, "morphology")
-    if morph is None:
+    ms = value_start(line, "morphology")
+    if ms < 0:
         return line
+    me = line.find('"', ms)
+    if me < 0:
+        return line
+    morph = line[ms:me]
 
-    current_feat = get_attr(line, "FEAT")
+    fs = value_start(line, "FEAT")
+    fe = line.find('"', fs) if fs >= 0 else -1
+    current_feat = line[fs:fe] if fe >= 0 else None
     new_feat = combine_feat_and_morph(current_feat or "", morph)
 
+    # Common case: FEAT and morphology are separate, well-formed attributes, so
+    # the FEAT value is rewritten and ` morphology="..."` cut in one splice.
+    if fe >= 0 and line.find('FEAT="') + 6 == fs:
+        rs = len(line[:ms - len('morphology="')].rstrip())
+        if fe < rs and not new_feat.endswith("="):
+            return line[:fs] + new_feat + line[fe:rs] + line[me + 1:]
+        if me < fs - 6:
+            return line[:rs] + line[me + 1:fs] + new_feat + line[fe:]
+
+    # Otherwise (FEAT missing or oddly placed): set, then remove
     line = set_attr(line, "FEAT", new_feat)
-    line = remove_attr(line, "morphology")
-    return line
+    return remove_attr(line, "morphology")
 
 # --- File I/O & CLI -----------------------------------------------------------
 
+def process_text(text: str) -> str:
+    """Transform a whole file's text in memory (same result as process_file)."""
+    if 'morphology="' not in text:
+        # Nothing to fold (the usual case after stage 09): only the final newline
+        return text if not text or text.endswith("\n") else text + "\n"
+    lines = text.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    out = []
+    for line in lines:
+        res = transform_line(line)
+        out.append(res if res.endswith("\n") else res + "\n")
+    return "".join(out)
+
+WRITE_BATCH = 8192   # lines per writelines() call
+
 def process_file(input_path: Path, output_path: Path) -> None:
-    with input_path.open("r", encoding="utf-8") as infile, output_path.open("w", encoding="utf-8") as outfile:
+    with input_path.open("r", encoding="utf-8", buffering=IO_BUFFER_SIZE) as infile, \
+         output_path.open("w", encoding="utf-8", buffering=IO_BUFFER_SIZE) as outfile:
+        batch: list[str] = []
         for raw in infile:
-            out = transform_line(raw.rstrip("\n"))
-            outfile.write(out if out.endswith("\n") else out + "\n")
+            if 'morphology="' not in raw:
+                # Nothing to fold: pass the line through without a call
+                batch.append(raw if raw.endswith("\n") else raw + "\n")
+            else:
+                out = transform_line(raw.rstrip("\n"))
+                batch.append(out if out.endswith("\n") else out + "\n")
+            if len(batch) >= WRITE_BATCH:
+                outfile.writelines(batch)
+                batch.clear()
+        outfile.writelines(batch)
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Stage 10: fold morphology into FEAT and remove morphology.")
@@ -31,34 +31,15 @@ CLI
 from __future__ import annotations
 
 import argparse
-import re
+from bisect import bisect_right, insort
 from pathlib import Path
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Dict
 
-SENT_CLOSE = "</sentence>"
+from _attr_utils import get_attr, remove_attr, set_attr
+from _stage_io import SENT_END, rewrite_file, rewrite_text
 
 # ---------------- Attribute helpers ----------------
 
-def get_attr(line: str, name: str) -> Optional[str]:
-    m = re.search(fr'\b{name}="([^"]*)"', line)
-    return m.group(1) if m else None
-
-def has_attr(line: str, name: str) -> bool:
-    return bool(re.search(fr'\b{name}="', line))
-
-def set_attr(line: str, name: str, value: str) -> str:
-    if has_attr(line, name):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    # insert before '/>' or '>'
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
-
-def remove_attr(line: str, name: str) -> str:
-    return re.sub(fr'\s*\b{name}="[^"]*"', "", line, count=1)
-
 def leading_indent(line: str) -> str:
     return line[: len(line) - len(line.lstrip())]
 
@@ -86,6 +67,8 @@ def process_sentence(block: str) -> str:
     Transform a single sentence block (without trailing </sentence>).
     """
     tokens: List[str] = [t for t in block.splitlines() if t.strip()]
+    if 'part-of-speech="CCONJ"' not in block:
+        return "\n".join(tokens)
 
     # Collect CCONJs with their indices
     cconj_positions: List[Tuple[int, str]] = []
@@ -98,17 +81,32 @@ def process_sentence(block: str) -> str:
     if not cconj_positions:
         return "\n".join(tokens)
 
-    # Precompute: which CCONJs have no dependents
-    dependents_by_head = {}
-    for j, tok in enumerate(tokens):
-        hid = head_id(tok)
-        if hid:
-            dependents_by_head.setdefault(hid, []).append(j)
+    # Read every token's head once and index dependents by head-id (ascending
+    # token order); `put` keeps a token, its head and the index in sync.
+    heads: List[Optional[str]] = [head_id(t) for t in tokens]
+    deps: Dict[str, List[int]] = {}
+    for j, hid in enumerate(heads):
+        if hid is not None:
+            deps.setdefault(hid, []).append(j)
+
+    def put(j: int, line: str) -> None:
+        old_head = heads[j]
+        tokens[j] = line
+        heads[j] = new_head = head_id(line)
+        if new_head != old_head:
+            if old_head is not None:
+                deps[old_head].remove(j)
+            if new_head is not None:
+                insort(deps.setdefault(new_head, []), j)
+
+    # Precompute: which CCONJs have no dependents (a snapshot; not updated by `put`)
+    dependents_by_head = {hid: list(js) for hid, js in deps.items() if hid}
 
     # First non-punct dependent AFTER cconj (used to set cconj head later)
     def first_after_non_punct_dep_idx(c_idx: int, c_id: str) -> Optional[int]:
-        for j in range(c_idx + 1, len(tokens)):
-            if head_id(tokens[j]) == c_id and not is_punct(tokens[j]):
+        after = deps.get(c_id, [])
+        for j in after[bisect_right(after, c_idx):]:
+            if not is_punct(tokens[j]):
                 return j
         return None
 
@@ -117,10 +115,10 @@ def process_sentence(block: str) -> str:
         c_has_deps = c_id in dependents_by_head
         # If no dependents at all -> relation="cc" and continue
         if not c_has_deps:
-            tokens[c_idx] = set_attr(c_line, "relation", "cc")
+            put(c_idx, set_attr(c_line, "relation", "cc"))
             continue
 
-        c_head = head_id(c_line)  # may be None
+        c_head = heads[c_idx]  # may be None
         c_rel  = relation(c_line)
         if c_rel is None:
             # Nothing to propagate—still set cc at the end.
@@ -129,21 +127,20 @@ def process_sentence(block: str) -> str:
         # Find all dependents of this CCONJ (indices)
         dep_idxs = [j for j in dependents_by_head.get(c_id, [])]
 
+        # Punctuation flags, computed once for both loops below (only the
+        # anchor is rewritten in between, and the second loop skips it)
+        punct_mask = [is_punct(tokens[j]) for j in dep_idxs]
+
         # Determine the first non-punct dependent overall (may appear before or after CCONJ)
         first_non_punct_idx: Optional[int] = None
-        skipped_punct_idxs: List[int] = []
-        for j in dep_idxs:
-            if is_punct(tokens[j]):
-                # collect punct BEFORE we locate the first non-punct
-                if first_non_punct_idx is None:
-                    skipped_punct_idxs.append(j)
-                continue
-            first_non_punct_idx = j
-            break
+        for j, punct in zip(dep_idxs, punct_mask):
+            if not punct:
+                first_non_punct_idx = j
+                break
 
         if first_non_punct_idx is None:
             # All dependents are punctuation → mark CCONJ as cc and leave others as punct under it
-            tokens[c_idx] = set_attr(c_line, "relation", "cc")
+            put(c_idx, set_attr(c_line, "relation", "cc"))
             # Still try to set cconj head-id to the first non-punct after it (will be None)
             continue
 
@@ -154,52 +151,58 @@ def process_sentence(block: str) -> str:
         # Reattach anchor to CCONJ's head (or drop head-id if CCONJ had none),
         # and give it the CCONJ's relation.
         if c_head:
-            tokens[anchor_idx] = set_attr(tokens[anchor_idx], "head-id", c_head)
+            anchor_line = set_attr(tokens[anchor_idx], "head-id", c_head)
         else:
             # remove head-id attribute if present
-            tokens[anchor_idx] = remove_attr(tokens[anchor_idx], "head-id")
-        tokens[anchor_idx] = set_attr(tokens[anchor_idx], "relation", c_rel)
-
-        # Repoint any previously seen punctuation dependents to the anchor
-        for pj in skipped_punct_idxs:
-            tokens[pj] = set_attr(tokens[pj], "head-id", anchor_id)
+            anchor_line = remove_attr(tokens[anchor_idx], "head-id")
+        put(anchor_idx, set_attr(anchor_line, "relation", c_rel))
 
-        # Reattach remaining dependents to anchor; non-punct get relation="conj"
-        for j in dep_idxs:
+        # Reattach remaining dependents to anchor; non-punct get relation="conj".
+        # This also repoints punctuation dependents seen before the anchor, so
+        # each token is rewritten (and re-parsed) once.
+        for j, punct in zip(dep_idxs, punct_mask):
             if j == anchor_idx:
                 continue
-            if not is_punct(tokens[j]):
-                tokens[j] = set_attr(tokens[j], "relation", "conj")
-            tokens[j] = set_attr(tokens[j], "head-id", anchor_id)
+            line = tokens[j]
+            if not punct:
+                line = set_attr(line, "relation", "conj")
+            put(j, set_attr(line, "head-id", anchor_id))
 
         # Now set the CCONJ’s own head to the first non-punct dependent AFTER it (if any),
         # and force relation="cc".
         after_idx = first_after_non_punct_dep_idx(c_idx, c_id)
+        c_line = tokens[c_idx]
         if after_idx is not None:
             after_id = token_id(tokens[after_idx]) or ""
-            tokens[c_idx] = set_attr(tokens[c_idx], "head-id", after_id)
-        tokens[c_idx] = set_attr(tokens[c_idx], "relation", "cc")
+            c_line = set_attr(c_line, "head-id", after_id)
+        put(c_idx, set_attr(c_line, "relation", "cc"))
 
     return "\n".join(tokens)
 
 # ---------------- File I/O & CLI ----------------
 
-def process_file(input_path: Path, output_path: Path) -> None:
-    text = input_path.read_text(encoding="utf-8")
-    sentences = text.split(f"\n{SENT_CLOSE}")
-    for i in range(len(sentences)):
-        blk = sentences[i].strip()
-        if not blk:
-            continue
-        sentences[i] = process_sentence(blk)
-    output_path.write_text("\n".join(sentences), encoding="utf-8")
+def _process_part(part: str) -> str:
+    blk = part.strip()
+    return process_sentence(blk) if blk else part
+
+# Sentences are split on "\n</sentence>" and joined back with "\n", so the
+# delimiter itself is not written back (as in the original stage).
+SPLIT_SEP = f"\n{SENT_END}"
+
+def process_text(text: str, jobs: int = 1) -> str:
+    """Transform a whole file's text in memory (same result as process_file)."""
+    return rewrite_text(text, _process_part, jobs, sep=SPLIT_SEP, join="\n")
+
+def process_file(input_path: Path, output_path: Path, jobs: int = 1) -> None:
+    rewrite_file(input_path, output_path, _process_part, jobs, sep=SPLIT_SEP, join="\n")
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Stage 11: rewire coordination headed by CCONJ.")
     ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
     ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes (0 = all cores; default 1)")
     args = ap.parse_args()
-    process_file(args.inp, args.out)
+    process_file(args.inp, args.out, args.jobs)
 
 if __name__ == "__main__":
     main()
@@ -28,36 +28,15 @@ CLI
 from __future__ import annotations
 
 import argparse
-import re
+from bisect import insort
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Dict
 
-SENT_END = "</sentence>"
+from _attr_utils import get_attr, remove_attr, set_attr
+from _stage_io import SENT_END, rewrite_file, rewrite_text
 
 # ---------------- Attribute helpers ----------------
 
-def get_attr(line: str, name: str) -> Optional[str]:
-    m = re.search(fr'\b{name}="([^"]*)"', line)
-    return m.group(1) if m else None
-
-def has_attr(line: str, name: str) -> bool:
-    return bool(re.search(fr'\b{name}="', line))
-
-def set_attr(line: str, name: str, value: str) -> str:
-    """Set or replace XML-like attribute `name="value"` on a token line."""
-    if has_attr(line, name):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    # Insert before '/>' or '>'
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
-
-def remove_attr(line: str, name: str) -> str:
-    """Remove first occurrence of an attribute entirely."""
-    return re.sub(fr'\s*\b{name}="[^"]*"', "", line, count=1)
-
 def is_punct(line: str) -> bool:
     # Keep the exact spirit of your rule: check relation only
     return 'relation="punct"' in line
@@ -69,6 +48,8 @@ def process_sentence(block: str) -> str:
     Process a single sentence (no trailing </sentence> included).
     """
     tokens: List[str] = [t for t in block.splitlines() if t.strip()]
+    if 'empty-token-sort="C"' not in block:
+        return "\n".join(tokens)
 
     # Collect indices of C tokens
     c_indices: List[int] = []
@@ -79,6 +60,24 @@ def process_sentence(block: str) -> str:
     if not c_indices:
         return "\n".join(tokens)
 
+    # Read every token's head once and index dependents by head-id (ascending
+    # token order); `put` keeps a token, its head and the index in sync.
+    heads: List[Optional[str]] = [get_attr(t, "head-id") for t in tokens]
+    deps: Dict[str, List[int]] = {}
+    for j, hid in enumerate(heads):
+        if hid is not None:
+            deps.setdefault(hid, []).append(j)
+
+    def put(j: int, line: str) -> None:
+        old_head = heads[j]
+        tokens[j] = line
+        heads[j] = new_head = get_attr(line, "head-id")
+        if new_head != old_head:
+            if old_head is not None:
+                deps[old_head].remove(j)
+            if new_head is not None:
+                insort(deps.setdefault(new_head, []), j)
+
     # Process each C token independently
     to_delete: List[int] = []
     for c_idx in c_indices:
@@ -94,15 +93,10 @@ def process_sentence(block: str) -> str:
         if c_rel is None:
             continue
 
-        c_head = get_attr(c_line, "head-id")
+        c_head = heads[c_idx]
 
         # Find dependents of this C token (by sentence order)
-        dep_indices: List[int] = []
-        for j, tok in enumerate(tokens):
-            if j == c_idx:
-                continue
-            if get_attr(tok, "head-id") == c_id:
-                dep_indices.append(j)
+        dep_indices = [j for j in deps.get(c_id, ()) if j != c_idx]
 
         if not dep_indices:
             # Just delete the C token if it has no dependents
@@ -121,7 +115,7 @@ def process_sentence(block: str) -> str:
         else:
             # Remove head-id entirely if C had none
             first_dep_line = remove_attr(first_dep_line, "head-id")
-        tokens[first_dep_idx] = first_dep_line
+        put(first_dep_idx, first_dep_line)
 
         # 2) Update all other dependents:
         for j in dep_indices[1:]:
@@ -129,36 +123,39 @@ def process_sentence(block: str) -> str:
             if not is_punct(line):
                 line = set_attr(line, "relation", "parataxis")
             line = set_attr(line, "head-id", first_dep_id)
-            tokens[j] = line
+            put(j, line)
 
         # 3) Delete the C token
         to_delete.append(c_idx)
 
-    # Remove C tokens from the sentence (delete from highest index)
-    for idx in sorted(to_delete, reverse=True):
-        if 0 <= idx < len(tokens):
-            del tokens[idx]
-
-    return "\n".join(tokens)
+    # Remove C tokens from the sentence in one pass
+    dead = set(to_delete)
+    return "\n".join(t for i, t in enumerate(tokens) if i not in dead)
 
 # ---------------- File I/O & CLI ----------------
 
-def process_file(input_path: Path, output_path: Path) -> None:
-    text = input_path.read_text(encoding="utf-8")
-    sentences = text.split(f"\n{SENT_END}")
-    for i in range(len(sentences)):
-        blk = sentences[i].strip()
-        if not blk:
-            continue
-        sentences[i] = process_sentence(blk)
-    output_path.write_text("\n".join(sentences), encoding="utf-8")
+def _process_part(part: str) -> str:
+    blk = part.strip()
+    return process_sentence(blk) if blk else part
+
+# Sentences are split on "\n</sentence>" and joined back with "\n", so the
+# delimiter itself is not written back (as in the original stage).
+SPLIT_SEP = f"\n{SENT_END}"
+
+def process_text(text: str, jobs: int = 1) -> str:
+    """Transform a whole file's text in memory (same result as process_file)."""
+    return rewrite_text(text, _process_part, jobs, sep=SPLIT_SEP, join="\n")
+
+def process_file(input_path: Path, output_path: Path, jobs: int = 1) -> None:
+    rewrite_file(input_path, output_path, _process_part, jobs, sep=SPLIT_SEP, join="\n")
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Stage 12: remove empty C-tokens and reattach dependents.")
     ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
     ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes (0 = all cores; default 1)")
     args = ap.parse_args()
-    process_file(args.inp, args.out)
+    process_file(args.inp, args.out, args.jobs)
 
 if __name__ == "__main__":
     main()
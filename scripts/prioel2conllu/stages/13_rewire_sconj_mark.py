@@ -33,34 +33,12 @@ CLI
 from __future__ import annotations
 
 import argparse
-import re
+from bisect import insort
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Dict
 
-SENT_END = "</sentence>"
-
-# ---------------- Attribute helpers ----------------
-
-def get_attr(line: str, name: str) -> Optional[str]:
-    m = re.search(fr'\b{name}="([^"]*)"', line)
-    return m.group(1) if m else None
-
-def has_attr(line: str, name: str) -> bool:
-    return bool(re.search(fr'\b{name}="', line))
-
-def set_attr(line: str, name: str, value: str) -> str:
-    """Set or replace XML-like attribute name="value"."""
-    if has_attr(line, name):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
-
-def remove_attr(line: str, name: str) -> str:
-    """Remove the first occurrence of an attribute entirely."""
-    return re.sub(fr'\s*\b{name}="[^"]*"', "", line, count=1)
+from _attr_utils import get_attr, remove_attr, set_attr
+from _stage_io import rewrite_file, rewrite_text
 
 # ---------------- Mapping ----------------
 
@@ -78,6 +56,26 @@ DEPENDENT_RELATION_MAP = {
 def process_sentence(block: str) -> str:
     """Process a single sentence block (without trailing </sentence>)."""
     tokens: List[str] = [t for t in block.splitlines() if t.strip()]
+    if 'part-of-speech="SCONJ"' not in block:
+        return "\n".join(tokens)
+
+    # Read every token's head once and index dependents by head-id (ascending
+    # token order); `put` keeps a token, its head and the index in sync.
+    heads: List[Optional[str]] = [get_attr(t, "head-id") for t in tokens]
+    deps: Dict[str, List[int]] = {}
+    for j, hid in enumerate(heads):
+        if hid is not None:
+            deps.setdefault(hid, []).append(j)
+
+    def put(j: int, line: str) -> None:
+        old_head = heads[j]
+        tokens[j] = line
+        heads[j] = new_head = get_attr(line, "head-id")
+        if new_head != old_head:
+            if old_head is not None:
+                deps[old_head].remove(j)
+            if new_head is not None:
+                insort(deps.setdefault(new_head, []), j)
 
     for k, tok in enumerate(tokens):
         if 'part-of-speech="SCONJ"' not in tok:
@@ -87,61 +85,57 @@ def process_sentence(block: str) -> str:
         if not sconj_id:
             continue
 
-        sconj_head = get_attr(tok, "head-id")    # may be None
-        sconj_rel  = get_attr(tok, "relation")   # may be None
+        sconj_head = heads[k]                   # may be None
+        sconj_rel  = get_attr(tok, "relation")  # may be None
 
         # Relation for dependents derived from SCONJ's relation
         dep_rel = DEPENDENT_RELATION_MAP.get(sconj_rel or "", None)
 
         last_dep_id: Optional[str] = None
 
-        # For every token that depends on the SCONJ
-        for j in range(len(tokens)):
+        # For every token that depends on the SCONJ (snapshot: `put` edits the index)
+        for j in list(deps.get(sconj_id, ())):
             if j == k:
                 continue
-            if get_attr(tokens[j], "head-id") == sconj_id:
-                if dep_rel:
-                    tokens[j] = set_attr(tokens[j], "relation", dep_rel)
-                # Set head to SCONJ's head, or remove head-id if SCONJ has none
-                if sconj_head:
-                    tokens[j] = set_attr(tokens[j], "head-id", sconj_head)
-                else:
-                    tokens[j] = remove_attr(tokens[j], "head-id")
-                # Track the (last) dependent's id (matches legacy behavior)
-                last_dep_id = get_attr(tokens[j], "id") or last_dep_id
+            line = tokens[j]
+            if dep_rel:
+                line = set_attr(line, "relation", dep_rel)
+            # Set head to SCONJ's head, or remove head-id if SCONJ has none
+            if sconj_head:
+                line = set_attr(line, "head-id", sconj_head)
+            else:
+                line = remove_attr(line, "head-id")
+            put(j, line)
+            # Track the (last) dependent's id (matches legacy behavior)
+            last_dep_id = get_attr(line, "id") or last_dep_id
 
         # If we rewrote at least one dependent, turn SCONJ into `mark`
         if last_dep_id:
-            tokens[k] = set_attr(tokens[k], "relation", "mark")
-            tokens[k] = set_attr(tokens[k], "head-id", last_dep_id)
+            line = set_attr(tokens[k], "relation", "mark")
+            put(k, set_attr(line, "head-id", last_dep_id))
 
     return "\n".join(tokens)
 
 # ---------------- File I/O & CLI ----------------
 
-def process_file(input_path: Path, output_path: Path) -> None:
-    text = input_path.read_text(encoding="utf-8")
-    # Keep the delimiter shape used elsewhere: split by newline + </sentence> if present,
-    # but be tolerant of files that use bare </sentence>.
-    if "\n</sentence>" in text:
-        parts = text.split("\n</sentence>")
-        sep = "\n</sentence>"
-    else:
-        parts = text.split("</sentence>")
-        sep = "</sentence>"
-    for i in range(len(parts)):
-        blk = parts[i].strip()
-        if not blk:
-            continue
-        parts[i] = process_sentence(blk)
-    output_path.write_text(sep.join(parts), encoding="utf-8")
+def _process_part(part: str) -> str:
+    blk = part.strip()
+    return process_sentence(blk) if blk else part
+
+def process_text(text: str, jobs: int = 1) -> str:
+    """Transform a whole file's text in memory (same result as process_file)."""
+    return rewrite_text(text, _process_part, jobs)
+
+def process_file(input_path: Path, output_path: Path, jobs: int = 1) -> None:
+    rewrite_file(input_path, output_path, _process_part, jobs)
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Stage 13: rewire SCONJ as `mark` and relabel clause dependents.")
     ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
     ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes (0 = all cores; default 1)")
     args = ap.parse_args()
-    process_file(args.inp, args.out)
+    process_file(args.inp, args.out, args.jobs)
 
 if __name__ == "__main__":
     main()
@@ -28,38 +28,16 @@ CLI
 from __future__ import annotations
 
 import argparse
-import re
+from bisect import insort
 from pathlib import Path
-from typing import Optional, List, Set
+from typing import Optional, List, Set, Dict, Iterable
 
-SENT_END = "</sentence>"
-
-# ---------------- Attribute helpers ----------------
-
-def get_attr(line: str, name: str) -> Optional[str]:
-    m = re.search(fr'\b{name}="([^"]*)"', line)
-    return m.group(1) if m else None
-
-def has_attr(line: str, name: str) -> bool:
-    return bool(re.search(fr'\b{name}="', line))
-
-def set_attr(line: str, name: str, value: str) -> str:
-    """Set or replace XML-like attribute name="value" on a token line."""
-    if has_attr(line, name):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
-
-def remove_attr(line: str, name: str) -> str:
-    """Remove first occurrence of an attribute entirely."""
-    return re.sub(fr'\s*\b{name}="[^"]*"', "", line, count=1)
+from _attr_utils import get_attr, remove_attr, set_attr
+from _stage_io import IO_BUFFER_SIZE, detect_sep, iter_parts, iter_processed, iter_split, text_sep
 
 # ---------------- Core processing ----------------
 
-def collect_fixed_ids(sentences: List[str]) -> Set[str]:
+def collect_fixed_ids(sentences: Iterable[str]) -> Set[str]:
     """Gather ids of all tokens whose relation='fixed'."""
     fixed: Set[str] = set()
     for block in sentences:
@@ -75,8 +53,28 @@ def process_sentence(block: str, fixed_ids: Set[str]) -> str:
     Process one sentence's lines (no trailing </sentence>).
     """
     tokens = block.splitlines()
+    if 'part-of-speech="ADP"' not in block:
+        return "\n".join(tokens)
     modified: Set[str] = set()
 
+    # Read every token's head once and index dependents by head-id (ascending
+    # token order); `put` keeps a token, its head and the index in sync.
+    heads: List[Optional[str]] = [get_attr(t, "head-id") for t in tokens]
+    deps: Dict[str, List[int]] = {}
+    for j, hid in enumerate(heads):
+        if hid is not None:
+            deps.setdefault(hid, []).append(j)
+
+    def put(j: int, line: str) -> None:
+        old_head = heads[j]
+        tokens[j] = line
+        heads[j] = new_head = get_attr(line, "head-id")
+        if new_head != old_head:
+            if old_head is not None:
+                deps[old_head].remove(j)
+            if new_head is not None:
+                insort(deps.setdefault(new_head, []), j)
+
     for k, tok in enumerate(tokens):
         if 'part-of-speech="ADP"' not in tok:
             continue
@@ -90,19 +88,15 @@ def process_sentence(block: str, fixed_ids: Set[str]) -> str:
             continue
 
         adp_rel = get_attr(tok, "relation") or ""
-        adp_head = get_attr(tok, "head-id")
+        adp_head = heads[k]
 
         # --- Special case: lemma="z" and relation="aux" -> DET/det + Definite=Def
         if 'lemma="z"' in tok and adp_rel == "aux":
-            # POS -> DET, relation -> det
+            # POS -> DET, relation -> det, and FEAT="Definite=Def" (set_attr
+            # overwrites FEAT if present and adds it otherwise)
             line = set_attr(tok, "part-of-speech", "DET")
             line = set_attr(line, "relation", "det")
-            # Overwrite FEAT if present, else add FEAT="Definite=Def"
-            if has_attr(line, "FEAT"):
-                line = set_attr(line, "FEAT", "Definite=Def")
-            else:
-                line = set_attr(line, "FEAT", "Definite=Def")
-            tokens[k] = line
+            put(k, set_attr(line, "FEAT", "Definite=Def"))
             modified.add(adp_id)
             continue
 
@@ -113,23 +107,24 @@ def process_sentence(block: str, fixed_ids: Set[str]) -> str:
 
         last_dep_id: Optional[str] = None
 
-        for l, oth in enumerate(tokens):
+        # Dependents of the ADP (snapshot: `put` edits the index)
+        for l in list(deps.get(adp_id, ())):
             if l == k:
                 continue
-            other_id = get_attr(oth, "id")
+            other_id = get_attr(tokens[l], "id")
             if not other_id:
                 continue
             if other_id in fixed_ids:
                 continue
 
-            if get_attr(oth, "head-id") == adp_id and other_id not in modified:
+            if other_id not in modified:
                 # Adopt ADP's relation and ADP's head
-                new_line = set_attr(oth, "relation", adp_rel)
+                new_line = set_attr(tokens[l], "relation", adp_rel)
                 if adp_head:
                     new_line = set_attr(new_line, "head-id", adp_head)
                 else:
                     new_line = remove_attr(new_line, "head-id")
-                tokens[l] = new_line
+                put(l, new_line)
                 modified.add(other_id)
                 last_dep_id = other_id  # track last seen dependent
 
@@ -141,25 +136,44 @@ def process_sentence(block: str, fixed_ids: Set[str]) -> str:
             modified.add(adp_id)
 
         # Regardless, ADP relation becomes 'case'
-        tokens[k] = set_attr(tokens[k], "relation", "case")
+        put(k, set_attr(tokens[k], "relation", "case"))
 
     return "\n".join(tokens)
 
-def process_file(input_path: Path, output_path: Path) -> None:
-    raw = input_path.read_text(encoding="utf-8")
-    # Be tolerant about the delimiter shape
-    parts = raw.split("\n</sentence>") if "\n</sentence>" in raw else raw.split("</sentence>")
+# ---------------- Streaming & file I/O ----------------
 
-    fixed_ids = collect_fixed_ids(parts)
+# Pool workers receive the fixed-id set once, through the initializer,
+# rather than with every chunk of sentences; with --jobs 1 it is set here.
+_fixed_ids: Set[str] = set()
 
-    for i, part in enumerate(parts):
-        blk = part.strip()
-        if not blk:
-            continue
-        parts[i] = process_sentence(blk, fixed_ids)
+def _set_fixed_ids(fixed_ids: Set[str]) -> None:
+    global _fixed_ids
+    _fixed_ids = fixed_ids
+
+def _process_part(part: str) -> str:
+    blk = part.strip()
+    return process_sentence(blk, _fixed_ids) if blk else part
+
+def process_text(raw: str, jobs: int = 1) -> str:
+    """Transform a whole file's text in memory (same result as process_file)."""
+    sep = text_sep(raw)
+    fixed_ids = collect_fixed_ids(iter_split(raw, sep))
+    return "".join(iter_processed(iter_split(raw, sep), sep, _process_part, jobs,
+                                  initializer=_set_fixed_ids, initargs=(fixed_ids,)))
 
-    sep = "\n</sentence>" if "\n</sentence>" in raw else "</sentence>"
-    output_path.write_text(sep.join(parts), encoding="utf-8")
+def process_file(input_path: Path, output_path: Path, jobs: int = 1) -> None:
+    """
+    Stream the input three times: to pick the delimiter, to collect the fixed
+    ids over the whole file, and to rewrite it sentence by sentence.
+    """
+    with input_path.open("r", encoding="utf-8", buffering=IO_BUFFER_SIZE) as infile, \
+         output_path.open("w", encoding="utf-8", buffering=IO_BUFFER_SIZE) as outfile:
+        sep = detect_sep(infile)
+        infile.seek(0)
+        fixed_ids = collect_fixed_ids(iter_parts(infile, sep))
+        infile.seek(0)
+        outfile.writelines(iter_processed(iter_parts(infile, sep), sep, _process_part, jobs,
+                                          initializer=_set_fixed_ids, initargs=(fixed_ids,)))
 
 # ---------------- CLI ----------------
 
@@ -167,8 +181,9 @@ def main() -> None:
     ap = argparse.ArgumentParser(description="Stage 14: rewire ADP structures to UD `case` and handle `z` → `DET`.")
     ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
     ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes (0 = all cores; default 1)")
     args = ap.parse_args()
-    process_file(args.inp, args.out)
+    process_file(args.inp, args.out, args.jobs)
 
 if __name__ == "__main__":
     main()
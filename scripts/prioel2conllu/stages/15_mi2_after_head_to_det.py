@@ -24,41 +24,62 @@ CLI
 from __future__ import annotations
 
 import argparse
-import re
+import io
+from bisect import bisect_left
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, List, Tuple
 
-# -------- Attribute helpers --------
-
-def get_attr(line: str, name: str) -> Optional[str]:
-    m = re.search(fr'\b{name}="([^"]*)"', line)
-    return m.group(1) if m else None
-
-def has_attr(line: str, name: str) -> bool:
-    return bool(re.search(fr'\b{name}="', line))
+from _attr_utils import feats_to_str, get_attr, parse_feats, set_attr
 
-def set_attr(line: str, name: str, value: str) -> str:
-    """Set or replace XML-like attribute name="value"."""
-    if has_attr(line, name):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
+# -------- Attribute helpers --------
 
-def parse_feats(s: Optional[str]) -> Dict[str, str]:
+def _split_feats(s: Optional[str]) -> Optional[Tuple[List[str], List[str]]]:
+    """
+    (keys, entries) of a FEAT string already in feats_to_str form (sorted,
+    unique keys, every entry key=value), else None.
+    """
     if not s or s == "_":
-        return {}
-    out: Dict[str, str] = {}
-    for kv in s.split("|"):
-        if "=" in kv:
-            k, v = kv.split("=", 1)
-            out[k] = v
-    return out
-
-def feats_to_str(d: Dict[str, str]) -> str:
-    return "_" if not d else "|".join(f"{k}={d[k]}" for k in sorted(d))
+        return [], []
+    items = s.split("|")
+    keys: List[str] = []
+    for kv in items:
+        k = kv.find("=")
+        if k < 0 or (keys and kv[:k] <= keys[-1]):
+            return None
+        keys.append(kv[:k])
+    return keys, items
+
+def feat_set(s: Optional[str], key: str, value: str) -> str:
+    """
+    Set one feature and serialize as feats_to_str would. Canonical strings (what
+    the earlier stages write) are edited in place; anything else is re-parsed.
+    """
+    split = _split_feats(s)
+    if split is None:
+        d = parse_feats(s)
+        d[key] = value
+        return feats_to_str(d)
+    keys, items = split
+    i = bisect_left(keys, key)
+    if i < len(keys) and keys[i] == key:
+        items[i] = f"{key}={value}"
+    else:
+        items.insert(i, f"{key}={value}")
+    return "|".join(items)
+
+def feat_del(s: Optional[str], key: str, value: str) -> str:
+    """Drop `key` if it is set to `value`; serialized as feats_to_str would."""
+    split = _split_feats(s)
+    if split is None:
+        d = parse_feats(s)
+        if d.get(key) == value:
+            del d[key]
+        return feats_to_str(d)
+    keys, items = split
+    i = bisect_left(keys, key)
+    if i < len(keys) and items[i] == f"{key}={value}":
+        del items[i]
+    return "|".join(items) or "_"
 
 # -------- Core transform --------
 
@@ -79,20 +100,18 @@ def transform_lines(lines: list[str], verbose: bool = False) -> list[str]:
             continue
 
         tid = get_attr(line, "id")
-        lemma = get_attr(line, "lemma")
-        head  = get_attr(line, "head-id")
+        # Only mi#2 lines need their lemma/head read; a substring test rules out the rest
+        is_mi2 = 'lemma="mi#2"' in line and get_attr(line, "lemma") == "mi#2"
+        head  = get_attr(line, "head-id") if is_mi2 else None
 
         # Apply rule: lemma=mi#2 AND head already seen in this sentence
-        if lemma == "mi#2" and head and head in processed_ids_in_sentence:
+        if is_mi2 and head and head in processed_ids_in_sentence:
             # POS -> DET
             line = set_attr(line, "part-of-speech", "DET")
 
             # FEAT: remove NumType=Card (if any), then add Definite=Spec
-            feats = parse_feats(get_attr(line, "FEAT"))
-            if feats.get("NumType") == "Card":
-                del feats["NumType"]
-            feats["Definite"] = "Spec"
-            line = set_attr(line, "FEAT", feats_to_str(feats))
+            feats = feat_del(get_attr(line, "FEAT"), "NumType", "Card")
+            line = set_attr(line, "FEAT", feat_set(feats, "Definite", "Spec"))
 
             if verbose and tid:
                 print(f"[mi#2->DET] token id={tid}: removed NumType=Card; added Definite=Spec")
@@ -101,18 +120,21 @@ def transform_lines(lines: list[str], verbose: bool = False) -> list[str]:
         if tid:
             processed_ids_in_sentence.add(tid)
 
-        out_lines.append(line + ("\n" if not raw.endswith("\n") else ""))
+        out_lines.append(line + ("\n" if raw.endswith("\n") else ""))
 
     return out_lines
 
 # -------- File I/O & CLI --------
 
+def process_text(text: str, verbose: bool = False) -> str:
+    """Transform a whole file's text in memory (same result as process_file)."""
+    if 'lemma="mi#2"' not in text:
+        return text
+    return "".join(transform_lines(io.StringIO(text).readlines(), verbose=verbose))
+
 def process_file(input_path: Path, output_path: Path, verbose: bool = False) -> None:
-    with input_path.open("r", encoding="utf-8") as f:
-        lines = f.readlines()
-    new_lines = transform_lines(lines, verbose=verbose)
-    with output_path.open("w", encoding="utf-8") as f:
-        f.writelines(new_lines)
+    text = input_path.read_text(encoding="utf-8")
+    output_path.write_text(process_text(text, verbose=verbose), encoding="utf-8")
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Stage 15: convert mi#2 to DET if it follows its head.")
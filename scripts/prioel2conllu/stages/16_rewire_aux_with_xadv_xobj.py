@@ -30,42 +30,18 @@ CLI
 from __future__ import annotations
 
 import argparse
-import re
+from bisect import insort
 from pathlib import Path
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Dict
 
-SENT_END = "</sentence>"
-
-# ------------- Attribute helpers -------------
-
-def get_attr(line: str, name: str) -> Optional[str]:
-    m = re.search(fr'\b{name}="([^"]*)"', line)
-    return m.group(1) if m else None
-
-def has_attr(line: str, name: str) -> bool:
-    return bool(re.search(fr'\b{name}="', line))
-
-def set_attr(line: str, name: str, value: str) -> str:
-    """Set or replace XML-like attribute name="value" on a token line."""
-    if has_attr(line, name):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
-
-def remove_attr(line: str, name: str) -> str:
-    return re.sub(fr'\s*\b{name}="[^"]*"', "", line, count=1)
+from _attr_utils import get_attr, remove_attr, set_attr
+from _stage_io import rewrite_file, rewrite_text
 
 # ------------- Per-sentence processing -------------
 
 def is_aux(line: str) -> bool:
     return 'part-of-speech="AUX"' in line
 
-def is_dep_of(line: str, head_id: str) -> bool:
-    return get_attr(line, "head-id") == head_id
-
 def is_xadv_or_xobj(line: str) -> bool:
     rel = get_attr(line, "relation")
     return rel in {"xadv", "xobj"}
@@ -80,6 +56,26 @@ def process_sentence(block: str) -> str:
     tokens: List[str] = [t for t in block.splitlines() if t.strip()]
     if not tokens:
         return block
+    if 'part-of-speech="AUX"' not in block:
+        return "\n".join(tokens)
+
+    # Read every token's head once and index dependents by head-id (ascending
+    # token order); `put` keeps a token, its head and the index in sync.
+    heads: List[Optional[str]] = [get_attr(t, "head-id") for t in tokens]
+    deps: Dict[str, List[int]] = {}
+    for j, hid in enumerate(heads):
+        if hid is not None:
+            deps.setdefault(hid, []).append(j)
+
+    def put(j: int, line: str) -> None:
+        old_head = heads[j]
+        tokens[j] = line
+        heads[j] = new_head = get_attr(line, "head-id")
+        if new_head != old_head:
+            if old_head is not None:
+                deps[old_head].remove(j)
+            if new_head is not None:
+                insort(deps.setdefault(new_head, []), j)
 
     # Collect AUX indices and ids
     aux_positions: List[Tuple[int, str]] = []
@@ -91,15 +87,13 @@ def process_sentence(block: str) -> str:
 
     for aux_idx, aux_id in aux_positions:
         aux_line = tokens[aux_idx]
-        aux_head = get_attr(aux_line, "head-id")      # may be None
+        aux_head = heads[aux_idx]                     # may be None
         aux_rel  = get_attr(aux_line, "relation")     # may be None
 
         # Find the xadv/xobj predicate among dependents
         pred_idx: Optional[int] = None
-        for j, tok in enumerate(tokens):
-            if j == aux_idx:
-                continue
-            if is_dep_of(tok, aux_id) and is_xadv_or_xobj(tok):
+        for j in deps.get(aux_id, ()):
+            if j != aux_idx and is_xadv_or_xobj(tokens[j]):
                 pred_idx = j
                 break
 
@@ -117,44 +111,45 @@ def process_sentence(block: str) -> str:
             pred_line = set_attr(pred_line, "head-id", aux_head)
         else:
             pred_line = remove_attr(pred_line, "head-id")
-        tokens[pred_idx] = pred_line
+        put(pred_idx, pred_line)
 
         # Decide AUX new relation based on predicate's features
         new_aux_rel = decide_aux_relation(pred_line)
 
         # ---- Step 2: move other dependents under predicate ----
+        # (snapshot: `put` edits the index)
         pred_id = get_attr(pred_line, "id") or ""
-        for j, tok in enumerate(tokens):
+        for j in list(deps.get(aux_id, ())):
             if j == aux_idx or j == pred_idx:
                 continue
-            if is_dep_of(tok, aux_id):
-                tokens[j] = set_attr(tok, "head-id", pred_id)
+            put(j, set_attr(tokens[j], "head-id", pred_id))
 
         # ---- Step 3: AUX points to predicate, relation becomes aux/cop ----
-        tokens[aux_idx] = set_attr(tokens[aux_idx], "head-id", pred_id)
-        tokens[aux_idx] = set_attr(tokens[aux_idx], "relation", new_aux_rel)
+        line = set_attr(tokens[aux_idx], "head-id", pred_id)
+        put(aux_idx, set_attr(line, "relation", new_aux_rel))
 
     return "\n".join(tokens)
 
 # ------------- File I/O & CLI -------------
 
-def process_file(input_path: Path, output_path: Path) -> None:
-    raw = input_path.read_text(encoding="utf-8")
-    parts = raw.split("\n</sentence>") if "\n</sentence>" in raw else raw.split("</sentence>")
-    for i in range(len(parts)):
-        blk = parts[i].strip()
-        if not blk:
-            continue
-        parts[i] = process_sentence(blk)
-    sep = "\n</sentence>" if "\n</sentence>" in raw else "</sentence>"
-    output_path.write_text(sep.join(parts), encoding="utf-8")
+def _process_part(part: str) -> str:
+    blk = part.strip()
+    return process_sentence(blk) if blk else part
+
+def process_text(text: str, jobs: int = 1) -> str:
+    """Transform a whole file's text in memory (same result as process_file)."""
+    return rewrite_text(text, _process_part, jobs)
+
+def process_file(input_path: Path, output_path: Path, jobs: int = 1) -> None:
+    rewrite_file(input_path, output_path, _process_part, jobs)
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Stage 16: rewire AUX using xadv/xobj predicate.")
     ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
     ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes (0 = all cores; default 1)")
     args = ap.parse_args()
-    process_file(args.inp, args.out)
+    process_file(args.inp, args.out, args.jobs)
 
 if __name__ == "__main__":
     main()
@@ -21,31 +21,11 @@ CLI
 from __future__ import annotations
 
 import argparse
-import re
 from pathlib import Path
 from typing import Optional, List
 
-SENT_END = "</sentence>"
-
-# ---------------- Attribute helpers ----------------
-
-def get_attr(line: str, name: str) -> Optional[str]:
-    m = re.search(fr'\b{name}="([^"]*)"', line)
-    return m.group(1) if m else None
-
-def has_attr(line: str, name: str) -> bool:
-    return bool(re.search(fr'\b{name}="', line))
-
-def set_attr(line: str, name: str, value: str) -> str:
-    """Set or replace an XML-like attribute name="value" on a token line."""
-    if has_attr(line, name):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    # Insert before '/>' or '>' if present; fall back to append.
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
+from _attr_utils import get_attr, has_attr, set_attr
+from _stage_io import rewrite_file, rewrite_text
 
 # ---------------- Per-sentence processing ----------------
 
@@ -54,6 +34,8 @@ def process_sentence(block: str) -> str:
     Process one sentence block (without the trailing </sentence>).
     """
     tokens: List[str] = [t for t in block.splitlines()]
+    if 'relation="parpred"' not in block:
+        return "\n".join(tokens)
 
     # Find the first predicate token id
     pred_id: Optional[str] = None
@@ -84,31 +66,24 @@ def process_sentence(block: str) -> str:
 
 # ---------------- File I/O & CLI ----------------
 
-def process_file(input_path: Path, output_path: Path) -> None:
-    text = input_path.read_text(encoding="utf-8")
-
-    # Be tolerant to either "\n</sentence>" or bare "</sentence>"
-    if "\n</sentence>" in text:
-        parts = text.split("\n</sentence>")
-        sep = "\n</sentence>"
-    else:
-        parts = text.split("</sentence>")
-        sep = "</sentence>"
+def _process_part(part: str) -> str:
+    blk = part.strip()
+    return process_sentence(blk) if blk else part
 
-    for i in range(len(parts)):
-        blk = parts[i].strip()
-        if not blk:
-            continue
-        parts[i] = process_sentence(blk)
+def process_text(text: str, jobs: int = 1) -> str:
+    """Transform a whole file's text in memory (same result as process_file)."""
+    return rewrite_text(text, _process_part, jobs)
 
-    output_path.write_text(sep.join(parts), encoding="utf-8")
+def process_file(input_path: Path, output_path: Path, jobs: int = 1) -> None:
+    rewrite_file(input_path, output_path, _process_part, jobs)
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Stage 17: attach parpred tokens to the sentence pred.")
     ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
     ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes (0 = all cores; default 1)")
     args = ap.parse_args()
-    process_file(args.inp, args.out)
+    process_file(args.inp, args.out, args.jobs)
 
 if __name__ == "__main__":
     main()
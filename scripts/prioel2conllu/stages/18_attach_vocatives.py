@@ -20,31 +20,11 @@ CLI
 from __future__ import annotations
 
 import argparse
-import re
 from pathlib import Path
 from typing import Optional, List
 
-SENT_END = "</sentence>"
-
-# ---------- Attribute helpers ----------
-
-def get_attr(line: str, name: str) -> Optional[str]:
-    m = re.search(fr'\b{name}="([^"]*)"', line)
-    return m.group(1) if m else None
-
-def has_attr(line: str, name: str) -> bool:
-    return bool(re.search(fr'\b{name}="', line))
-
-def set_attr(line: str, name: str, value: str) -> str:
-    """Set or replace XML-like attribute name="value"."""
-    if has_attr(line, name):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    # Insert before '/>' or '>'
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
+from _attr_utils import get_attr, set_attr
+from _stage_io import rewrite_file, rewrite_text
 
 # ---------- Per-sentence processing ----------
 
@@ -53,19 +33,26 @@ def process_sentence(block: str) -> str:
     Process one sentence (block without trailing </sentence>).
     """
     tokens: List[str] = block.splitlines()
+    if 'relation="voc"' not in block:
+        return "\n".join(tokens)
 
     pred_id: Optional[str] = None
     imp_pred_id: Optional[str] = None
 
-    # Pass 1: find pred_id and imp_pred_id (prefer imperative)
+    # Pass 1: find pred_id and imp_pred_id (prefer imperative). Without Mood=Imp
+    # anywhere in the block, only the first pred is needed.
+    imp_possible = "Mood=Imp" in block
     for tok in tokens:
         rel = get_attr(tok, "relation")
         if rel == "pred" and not pred_id:
             pred_id = get_attr(tok, "id")
-        if ("Mood=Imp" in tok) and (rel in {"pred", "parpred"}) and not imp_pred_id:
-            imp_pred_id = get_attr(tok, "id")
-            # We can break if we already have pred_id, but keeping it simple & clear
-            # continue to finish scanning quickly.
+        if imp_possible:
+            if ("Mood=Imp" in tok) and (rel in {"pred", "parpred"}):
+                imp_pred_id = get_attr(tok, "id")
+                if imp_pred_id:
+                    break   # the imperative wins; pred_id no longer matters
+        elif pred_id:
+            break
 
     # Pass 2: attach vocatives
     target_id = imp_pred_id or pred_id
@@ -80,31 +67,24 @@ def process_sentence(block: str) -> str:
 
 # ---------- File I/O & CLI ----------
 
-def process_file(input_path: Path, output_path: Path) -> None:
-    text = input_path.read_text(encoding="utf-8")
-
-    # Be tolerant to either "\n</sentence>" or bare "</sentence>"
-    if "\n</sentence>" in text:
-        parts = text.split("\n</sentence>")
-        sep = "\n</sentence>"
-    else:
-        parts = text.split("</sentence>")
-        sep = "</sentence>"
+def _process_part(part: str) -> str:
+    blk = part.strip()
+    return process_sentence(blk) if blk else part
 
-    for i, part in enumerate(parts):
-        blk = part.strip()
-        if not blk:
-            continue
-        parts[i] = process_sentence(blk)
+def process_text(text: str, jobs: int = 1) -> str:
+    """Transform a whole file's text in memory (same result as process_file)."""
+    return rewrite_text(text, _process_part, jobs)
 
-    output_path.write_text(sep.join(parts), encoding="utf-8")
+def process_file(input_path: Path, output_path: Path, jobs: int = 1) -> None:
+    rewrite_file(input_path, output_path, _process_part, jobs)
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Stage 18: attach vocatives to the predicate (prefer imperative).")
     ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
     ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes (0 = all cores; default 1)")
     args = ap.parse_args()
-    process_file(args.inp, args.out)
+    process_file(args.inp, args.out, args.jobs)
 
 if __name__ == "__main__":
     main()
@@ -22,41 +22,48 @@ CLI
 from __future__ import annotations
 
 import argparse
-import re
+from bisect import bisect_left
 from pathlib import Path
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple
 
-# ---------- Attribute helpers ----------
-
-def get_attr(line: str, name: str) -> Optional[str]:
-    m = re.search(fr'\b{name}="([^"]*)"', line)
-    return m.group(1) if m else None
+from _attr_utils import feats_to_str, get_attr, parse_feats, set_attr
+from _stage_io import rewrite_file, rewrite_text
 
-def has_attr(line: str, name: str) -> bool:
-    return bool(re.search(fr'\b{name}="', line))
-
-def set_attr(line: str, name: str, value: str) -> str:
-    """Set or replace XML-like attribute name="value"."""
-    if has_attr(line, name):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
+# ---------- Attribute helpers ----------
 
-def parse_feats(s: Optional[str]) -> Dict[str, str]:
+def _split_feats(s: Optional[str]) -> Optional[Tuple[List[str], List[str]]]:
+    """
+    (keys, entries) of a FEAT string already in feats_to_str form (sorted,
+    unique keys, every entry key=value), else None.
+    """
     if not s or s == "_":
-        return {}
-    out: Dict[str, str] = {}
-    for kv in s.split("|"):
-        if "=" in kv:
-            k, v = kv.split("=", 1)
-            out[k] = v
-    return out
-
-def feats_to_str(d: Dict[str, str]) -> str:
-    return "_" if not d else "|".join(f"{k}={d[k]}" for k in sorted(d))
+        return [], []
+    items = s.split("|")
+    keys: List[str] = []
+    for kv in items:
+        k = kv.find("=")
+        if k < 0 or (keys and kv[:k] <= keys[-1]):
+            return None
+        keys.append(kv[:k])
+    return keys, items
+
+def feat_set(s: Optional[str], key: str, value: str) -> str:
+    """
+    Set one feature and serialize as feats_to_str would. Canonical strings (what
+    the earlier stages write) are edited in place; anything else is re-parsed.
+    """
+    split = _split_feats(s)
+    if split is None:
+        d = parse_feats(s)
+        d[key] = value
+        return feats_to_str(d)
+    keys, items = split
+    i = bisect_left(keys, key)
+    if i < len(keys) and keys[i] == key:
+        items[i] = f"{key}={value}"
+    else:
+        items.insert(i, f"{key}={value}")
+    return "|".join(items)
 
 # ---------- Core per-sentence transform ----------
 
@@ -65,18 +72,25 @@ def process_sentence(block: str) -> str:
     Process one sentence (block without the trailing </sentence>).
     """
     tokens: List[str] = block.splitlines()
-
-    # Index by id for convenience
-    id_to_idx: Dict[str, int] = {}
-    for i, line in enumerate(tokens):
-        tid = get_attr(line, "id")
-        if tid:
-            id_to_idx[tid] = i
+    if "VerbForm=Inf" not in block:
+        return "\n".join(tokens)
+
+    # One pass: index dependents by head-id (this stage never rewrites head-id)
+    # and note the lines that can hold VerbForm=Inf
+    children: Dict[str, List[int]] = {}
+    inf_candidates: List[int] = []
+    for j, line in enumerate(tokens):
+        hid = get_attr(line, "head-id")
+        if hid is not None:
+            children.setdefault(hid, []).append(j)
+        if "VerbForm=Inf" in line:
+            inf_candidates.append(j)
 
     # For each token with VerbForm=Inf, check if any dependent is a 'case'
-    for i, line in enumerate(tokens):
-        feats = parse_feats(get_attr(line, "FEAT"))
-        if feats.get("VerbForm") != "Inf":
+    for i in inf_candidates:
+        line = tokens[i]
+        feat = get_attr(line, "FEAT")
+        if not feat or "VerbForm=Inf" not in feat or parse_feats(feat).get("VerbForm") != "Inf":
             continue
 
         tid = get_attr(line, "id")
@@ -84,9 +98,10 @@ def process_sentence(block: str) -> str:
             continue
 
         # Does it have at least one dependent with relation="case"?
+        dep_idxs = children.get(tid, ())
         has_case_dependent = False
-        for dep in tokens:
-            if get_attr(dep, "head-id") == tid and get_attr(dep, "relation") == "case":
+        for j in dep_idxs:
+            if get_attr(tokens[j], "relation") == "case":
                 has_case_dependent = True
                 break
 
@@ -94,45 +109,35 @@ def process_sentence(block: str) -> str:
             continue
 
         # 1) Promote to Vnoun
-        feats["VerbForm"] = "Vnoun"
-        tokens[i] = set_attr(tokens[i], "FEAT", feats_to_str(feats))
+        tokens[i] = set_attr(tokens[i], "FEAT", feat_set(feat, "VerbForm", "Vnoun"))
 
         # 2) Re-label dependents' 'obl' -> 'nmod'
-        for j, dep in enumerate(tokens):
-            if get_attr(dep, "head-id") == tid and get_attr(dep, "relation") == "obl":
-                tokens[j] = set_attr(dep, "relation", "nmod")
+        for j in dep_idxs:
+            if get_attr(tokens[j], "relation") == "obl":
+                tokens[j] = set_attr(tokens[j], "relation", "nmod")
 
     return "\n".join(tokens)
 
 # ---------- File I/O & CLI ----------
 
-def process_file(input_path: Path, output_path: Path) -> None:
-    text = input_path.read_text(encoding="utf-8")
-
-    # Be tolerant to either "\n</sentence>" or bare "</sentence>"
-    if "\n</sentence>" in text:
-        parts = text.split("\n</sentence>")
-        sep = "\n</sentence>"
-    else:
-        parts = text.split("</sentence>")
-        sep = "</sentence>"
-
-    for i, part in enumerate(parts):
-        blk = part.strip()
-        if not blk:
-            continue
-        parts[i] = process_sentence(blk)
+def _process_part(part: str) -> str:
+    blk = part.strip()
+    return process_sentence(blk) if blk else part
 
-    output_path.write_text(sep.join(parts), encoding="utf-8")
+def process_text(text: str, jobs: int = 1) -> str:
+    """Transform a whole file's text in memory (same result as process_file)."""
+    return rewrite_text(text, _process_part, jobs)
 
-# ---------- CLI ----------
+def process_file(input_path: Path, output_path: Path, jobs: int = 1) -> None:
+    rewrite_file(input_path, output_path, _process_part, jobs)
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Stage 19: promote infinitives with case into verbal nouns.")
     ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
     ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes (0 = all cores; default 1)")
     args = ap.parse_args()
-    process_file(args.inp, args.out)
+    process_file(args.inp, args.out, args.jobs)
 
 if __name__ == "__main__":
     main()
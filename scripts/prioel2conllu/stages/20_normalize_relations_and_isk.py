@@ -24,29 +24,9 @@ CLI
 from __future__ import annotations
 
 import argparse
-import re
 from pathlib import Path
-from typing import Optional
 
-# -------- Attribute helpers --------
-
-def get_attr(line: str, name: str) -> Optional[str]:
-    m = re.search(fr'\b{name}="([^"]*)"', line)
-    return m.group(1) if m else None
-
-def has_attr(line: str, name: str) -> bool:
-    return bool(re.search(fr'\b{name}="', line))
-
-def set_attr(line: str, name: str, value: str) -> str:
-    """Set or replace XML-like attribute name="value"."""
-    if has_attr(line, name):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    # Insert before '/>' or '>'
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
+from _attr_utils import get_attr, has_attr, set_attr
 
 # -------- Mapping --------
 
@@ -60,8 +40,10 @@ REL_MAP = {
 # -------- Core transform --------
 
 def transform_line(line: str) -> str:
-    # Skip mapping on lines that contain '<slash' (preserves your negative lookahead semantics)
-    if "<slash" not in line:
+    # Skip mapping on lines that contain '<slash' (preserves your negative lookahead semantics).
+    # The substring tests (one per REL_MAP key) rule out most lines before get_attr runs.
+    if "<slash" not in line and ('relation="pred"' in line or 'relation="xobj"' in line
+                                 or 'relation="ag"' in line or 'relation="rel"' in line):
         cur_rel = get_attr(line, "relation")
         if cur_rel in REL_MAP:
             line = set_attr(line, "relation", REL_MAP[cur_rel])
@@ -72,11 +54,14 @@ def transform_line(line: str) -> str:
 
     return line
 
+def process_text(text: str) -> str:
+    """Transform a whole file's text in memory (same result as process_file)."""
+    return "\n".join([transform_line(line) for line in text.split("\n")])
+
 def process_file(input_path: Path, output_path: Path) -> None:
-    with input_path.open("r", encoding="utf-8") as f_in, output_path.open("w", encoding="utf-8") as f_out:
-        for raw in f_in:
-            out = transform_line(raw.rstrip("\n"))
-            f_out.write(out if raw.endswith("\n") else out + "\n")
+    # Whole-file read and write instead of one write call per line
+    text = input_path.read_text(encoding="utf-8")
+    output_path.write_text(process_text(text), encoding="utf-8")
 
 # -------- CLI --------
 
@@ -22,28 +22,11 @@ CLI
 from __future__ import annotations
 
 import argparse
-import re
 from pathlib import Path
-from typing import Optional, List, Dict
+from typing import List, Dict
 
-# ---------- Attribute helpers ----------
-
-def get_attr(line: str, name: str) -> Optional[str]:
-    m = re.search(fr'\b{name}="([^"]*)"', line)
-    return m.group(1) if m else None
-
-def has_attr(line: str, name: str) -> bool:
-    return bool(re.search(fr'\b{name}="', line))
-
-def set_attr(line: str, name: str, value: str) -> str:
-    """Set or replace XML-like attribute name="value"."""
-    if has_attr(line, name):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
+from _attr_utils import get_attr, set_attr
+from _stage_io import rewrite_file, rewrite_text
 
 # ---------- Core per-sentence transform ----------
 
@@ -54,6 +37,8 @@ def process_sentence(block: str, verbose: bool = False) -> str:
     tokens: List[str] = block.splitlines()
     if not tokens:
         return block
+    if 'relation="parpred"' not in block:
+        return "\n".join(tokens)
 
     # Build an id -> index map for fast head lookup
     id2idx: Dict[str, int] = {}
@@ -84,32 +69,25 @@ def process_sentence(block: str, verbose: bool = False) -> str:
 
 # ---------- File I/O & CLI ----------
 
-def process_file(input_path: Path, output_path: Path, verbose: bool = False) -> None:
-    text = input_path.read_text(encoding="utf-8")
+def _process_part(part: str, verbose: bool = False) -> str:
+    blk = part.strip()
+    return process_sentence(blk, verbose=verbose) if blk else part
 
-    # Tolerate either "\n</sentence>" or bare "</sentence>"
-    if "\n</sentence>" in text:
-        parts = text.split("\n</sentence>")
-        sep = "\n</sentence>"
-    else:
-        parts = text.split("</sentence>")
-        sep = "</sentence>"
-
-    for i, part in enumerate(parts):
-        blk = part.strip()
-        if not blk:
-            continue
-        parts[i] = process_sentence(blk, verbose=verbose)
+def process_text(text: str, verbose: bool = False, jobs: int = 1) -> str:
+    """Transform a whole file's text in memory (same result as process_file)."""
+    return rewrite_text(text, _process_part, jobs, verbose)
 
-    output_path.write_text(sep.join(parts), encoding="utf-8")
+def process_file(input_path: Path, output_path: Path, verbose: bool = False, jobs: int = 1) -> None:
+    rewrite_file(input_path, output_path, _process_part, jobs, verbose)
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Stage 21: relabel parpred to ccomp/parataxis based on head lemma.")
     ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
     ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
     ap.add_argument("--verbose", action="store_true", help="Print debug messages")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes (0 = all cores; default 1)")
     args = ap.parse_args()
-    process_file(args.inp, args.out, verbose=args.verbose)
+    process_file(args.inp, args.out, verbose=args.verbose, jobs=args.jobs)
 
 if __name__ == "__main__":
     main()
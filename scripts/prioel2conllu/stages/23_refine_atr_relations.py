@@ -21,38 +21,11 @@ CLI
 from __future__ import annotations
 
 import argparse
-import re
 from pathlib import Path
 from typing import Dict, List, Optional, Set
 
-# -------- Attribute helpers --------
-
-def get_attr(line: str, name: str) -> Optional[str]:
-    m = re.search(fr'\b{name}="([^"]*)"', line)
-    return m.group(1) if m else None
-
-def has_attr(line: str, name: str) -> bool:
-    return bool(re.search(fr'\b{name}="', line))
-
-def set_attr(line: str, name: str, value: str) -> str:
-    """Set or replace XML-like attribute name="value"."""
-    if has_attr(line, name):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
-
-def parse_feats(s: Optional[str]) -> Dict[str, str]:
-    if not s or s == "_":
-        return {}
-    out: Dict[str, str] = {}
-    for kv in s.split("|"):
-        if "=" in kv:
-            k, v = kv.split("=", 1)
-            out[k] = v
-    return out
+from _attr_utils import feat_value, parse_attrs, parse_feats, set_attr
+from _stage_io import rewrite_file, rewrite_text
 
 # -------- Core per-sentence transform --------
 
@@ -61,38 +34,50 @@ def process_sentence(block: str, verbose: bool = False) -> str:
     Process one sentence (block without the trailing </sentence>).
     """
     tokens: List[str] = block.splitlines()
+    if 'relation="atr"' not in block:
+        return "\n".join(tokens)
+
+    # Parse every token once; `put` keeps a token and its attrs in sync.
+    attrs: List[Dict[str, str]] = [parse_attrs(t) for t in tokens]
+
+    def put(j: int, line: str) -> None:
+        tokens[j] = line
+        attrs[j] = parse_attrs(line)
 
     # Build indices
     id2idx: Dict[str, int] = {}
-    head_to_children: Dict[str, List[int]] = {}
-    for i, line in enumerate(tokens):
-        tid = get_attr(line, "id")
+    heads_with_children: Set[str] = set()   # rules only ask whether a token has dependents
+    for i, a in enumerate(attrs):
+        tid = a.get("id")
         if tid:
             id2idx[tid] = i
-        hid = get_attr(line, "head-id")
+        hid = a.get("head-id")
         if hid:
-            head_to_children.setdefault(hid, []).append(i)
+            heads_with_children.add(hid)
 
     def has_dependents(tid: Optional[str]) -> bool:
         if not tid:
             return False
-        return tid in head_to_children and len(head_to_children[tid]) > 0
+        return tid in heads_with_children
 
     for i, line in enumerate(tokens):
-        rel = get_attr(line, "relation")
+        a = attrs[i]
+        rel = a.get("relation")
         if rel != "atr":
             continue
 
-        tid   = get_attr(line, "id")
-        upos  = get_attr(line, "part-of-speech") or ""
-        feats = parse_feats(get_attr(line, "FEAT"))
-        lemma = get_attr(line, "lemma") or ""
-        hid   = get_attr(line, "head-id")
+        tid   = a.get("id")
+        upos  = a.get("part-of-speech") or ""
+        feat  = a.get("FEAT")
+        verbform = feat_value(feat, "VerbForm")   # rules 2 and 4 both read it
+        lemma = a.get("lemma") or ""
+        hid   = a.get("head-id")
 
         # Gather head info (if present)
-        head_line = tokens[id2idx[hid]] if (hid and hid in id2idx) else None
-        head_pos  = get_attr(head_line, "part-of-speech") if head_line else None
-        head_rel  = get_attr(head_line, "relation") if head_line else None
+        hidx      = id2idx[hid] if (hid and hid in id2idx) else None
+        head_line = tokens[hidx] if hidx is not None else None
+        head_pos  = attrs[hidx].get("part-of-speech") if head_line else None
+        head_rel  = attrs[hidx].get("relation") if head_line else None
         head_is_empty_v = bool(head_line and 'empty-token-sort="V"' in head_line)
 
         new_rel: Optional[str] = None
@@ -102,7 +87,7 @@ def process_sentence(block: str, verbose: bool = False) -> str:
             new_rel = "nummod"
 
         # 2) (POS=ADJ or VerbForm=Part) and NO dependents -> amod
-        elif (upos == "ADJ" or feats.get("VerbForm") == "Part") and not has_dependents(tid):
+        elif (upos == "ADJ" or verbform == "Part") and not has_dependents(tid):
             new_rel = "amod"
 
         # 3) POS=DET -> det
@@ -110,11 +95,11 @@ def process_sentence(block: str, verbose: bool = False) -> str:
             new_rel = "det"
 
         # 4) POS in {NOUN, PROPN, PRON} or VerbForm=Vnoun -> nmod
-        elif upos in {"NOUN", "PROPN", "PRON"} or feats.get("VerbForm") == "Vnoun":
+        elif upos in {"NOUN", "PROPN", "PRON"} or verbform == "Vnoun":
             new_rel = "nmod"
 
         # 5) Complex → obl
-        elif (head_pos in {"VERB", "AUX"} or head_is_empty_v or head_rel in {"cop", "mark"} or feats.get("PronType") == "Rel"):
+        elif (head_pos in {"VERB", "AUX"} or head_is_empty_v or head_rel in {"cop", "mark"} or feat_value(feat, "PronType") == "Rel"):
             new_rel = "obl"
 
         # 6) Special lemma anown with head acl → nsubj
@@ -126,40 +111,33 @@ def process_sentence(block: str, verbose: bool = False) -> str:
             new_rel = "acl"
 
         if verbose:
-            print(f'[atr->{new_rel}] id={tid or "?"} pos={upos} head={hid or "?"} headpos={head_pos or "-"} headrel={head_rel or "-"} feats={feats}')
+            print(f'[atr->{new_rel}] id={tid or "?"} pos={upos} head={hid or "?"} headpos={head_pos or "-"} headrel={head_rel or "-"} feats={parse_feats(feat)}')
 
-        tokens[i] = set_attr(line, "relation", new_rel)
+        put(i, set_attr(line, "relation", new_rel))
 
     return "\n".join(tokens)
 
 # -------- File I/O & CLI --------
 
-def process_file(input_path: Path, output_path: Path, verbose: bool = False) -> None:
-    text = input_path.read_text(encoding="utf-8")
+def _process_part(part: str, verbose: bool = False) -> str:
+    blk = part.strip()
+    return process_sentence(blk, verbose=verbose) if blk else part
 
-    # Support either "\n</sentence>" or bare "</sentence>" separators
-    if "\n</sentence>" in text:
-        parts = text.split("\n</sentence>")
-        sep = "\n</sentence>"
-    else:
-        parts = text.split("</sentence>")
-        sep = "</sentence>"
-
-    for i, part in enumerate(parts):
-        blk = part.strip()
-        if not blk:
-            continue
-        parts[i] = process_sentence(blk, verbose=verbose)
+def process_text(text: str, verbose: bool = False, jobs: int = 1) -> str:
+    """Transform a whole file's text in memory (same result as process_file)."""
+    return rewrite_text(text, _process_part, jobs, verbose)
 
-    output_path.write_text(sep.join(parts), encoding="utf-8")
+def process_file(input_path: Path, output_path: Path, verbose: bool = False, jobs: int = 1) -> None:
+    rewrite_file(input_path, output_path, _process_part, jobs, verbose)
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Stage 23: refine relation='atr' into UD labels.")
     ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
     ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
     ap.add_argument("--verbose", action="store_true", help="Print debug decisions")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes (0 = all cores; default 1)")
     args = ap.parse_args()
-    process_file(args.inp, args.out, verbose=args.verbose)
+    process_file(args.inp, args.out, verbose=args.verbose, jobs=args.jobs)
 
 if __name__ == "__main__":
     main()
@@ -27,67 +27,47 @@ CLI
 from __future__ import annotations
 
 import argparse
-import re
 from pathlib import Path
-from typing import Dict, List, Optional
-
-# -------- Attribute helpers --------
-
-def get_attr(line: str, name: str) -> Optional[str]:
-    m = re.search(fr'\b{name}="([^"]*)"', line)
-    return m.group(1) if m else None
-
-def has_attr(line: str, name: str) -> bool:
-    return bool(re.search(fr'\b{name}="', line))
-
-def set_attr(line: str, name: str, value: str) -> str:
-    """Set or replace XML-like attribute name="value" on a token line."""
-    if has_attr(line, name):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
-
-def parse_feats(s: Optional[str]) -> Dict[str, str]:
-    if not s or s == "_":
-        return {}
-    out: Dict[str, str] = {}
-    for kv in s.split("|"):
-        if "=" in kv:
-            k, v = kv.split("=", 1)
-            out[k] = v
-    return out
+from typing import Dict, FrozenSet, List, Optional
+
+from _attr_utils import feat_value, parse_attrs, set_attr
+from _stage_io import rewrite_file, rewrite_text
 
 # -------- Tiny predicates --------
 
-def is_verbalish(line: str) -> bool:
+def is_verbalish(line: str, attrs: Dict[str, str]) -> bool:
     return (
-        get_attr(line, "part-of-speech") in {"VERB", "AUX"}
+        attrs.get("part-of-speech") in {"VERB", "AUX"}
         or ('empty-token-sort="V"' in line)
     )
 
-def head_pos_is(line: Optional[str], pos_set: set[str]) -> bool:
-    return bool(line and get_attr(line, "part-of-speech") in pos_set)
+# POS sets passed to head_pos_is; an `in {...}` test is folded to a constant by
+# the compiler, but a set literal passed as an argument is rebuilt on every call
+NOMINALISH_POS = frozenset({"NOUN", "PROPN", "PRON", "ADJ", "NUM"})
+PROPN_POS      = frozenset({"PROPN"})
+
+def head_pos_is(attrs: Optional[Dict[str, str]], pos_set: FrozenSet[str]) -> bool:
+    return bool(attrs and attrs.get("part-of-speech") in pos_set)
 
-def has_clausal_dependent(token_id: str, tokens: List[str]) -> bool:
+def has_clausal_dependent(token_id: str, attrs: List[Dict[str, str]],
+                          children: Dict[str, List[int]]) -> bool:
     """
     A dependent is 'clausal' if relation in {cop, mark} OR FEAT PronType=Rel.
+    `children` maps a head-id to the indices of its dependents in `attrs`.
     """
-    for t in tokens:
-        if get_attr(t, "head-id") == token_id:
-            rel = get_attr(t, "relation")
-            if rel in {"cop", "mark"}:
-                return True
-            feats = parse_feats(get_attr(t, "FEAT"))
-            if feats.get("PronType") == "Rel":
-                return True
+    for j in children.get(token_id, ()):
+        a = attrs[j]
+        rel = a.get("relation")
+        if rel in {"cop", "mark"}:
+            return True
+        if feat_value(a.get("FEAT"), "PronType") == "Rel":
+            return True
     return False
 
-def has_dependent_lemma(token_id: str, tokens: List[str], lemma: str) -> bool:
-    for t in tokens:
-        if get_attr(t, "head-id") == token_id and get_attr(t, "lemma") == lemma:
+def has_dependent_lemma(token_id: str, attrs: List[Dict[str, str]],
+                        children: Dict[str, List[int]], lemma: str) -> bool:
+    for j in children.get(token_id, ()):
+        if attrs[j].get("lemma") == lemma:
             return True
     return False
 
@@ -95,40 +75,55 @@ def has_dependent_lemma(token_id: str, tokens: List[str], lemma: str) -> bool:
 
 def process_sentence(block: str, verbose: bool = False) -> str:
     tokens: List[str] = block.splitlines()
+    if 'relation="apos"' not in block:
+        return "\n".join(tokens)
+
+    # Parse every token once; `put` keeps a token and its attrs in sync.
+    attrs: List[Dict[str, str]] = [parse_attrs(t) for t in tokens]
 
-    # Indexes
+    def put(j: int, line: str) -> None:
+        tokens[j] = line
+        attrs[j] = parse_attrs(line)
+
+    # Indexes (this stage never rewrites id or head-id, so they stay valid)
     id2idx: Dict[str, int] = {}
-    for i, line in enumerate(tokens):
-        tid = get_attr(line, "id")
+    children: Dict[str, List[int]] = {}
+    for i, a in enumerate(attrs):
+        tid = a.get("id")
         if tid:
             id2idx[tid] = i
+        hid = a.get("head-id")
+        if hid is not None:
+            children.setdefault(hid, []).append(i)
 
     for i, line in enumerate(tokens):
-        if get_attr(line, "relation") != "apos":
+        a = attrs[i]
+        if a.get("relation") != "apos":
             continue
 
-        tid   = get_attr(line, "id")
-        upos  = get_attr(line, "part-of-speech") or ""
-        feats = parse_feats(get_attr(line, "FEAT"))
-        hid   = get_attr(line, "head-id")
-        head  = tokens[id2idx[hid]] if (hid and hid in id2idx) else None
+        tid   = a.get("id")
+        upos  = a.get("part-of-speech") or ""
+        hid   = a.get("head-id")
+        hidx  = id2idx[hid] if (hid and hid in id2idx) else None
+        head  = tokens[hidx] if hidx is not None else None
+        head_attrs = attrs[hidx] if hidx is not None else {}
 
         # Helpers for rules
-        token_is_verbalish = is_verbalish(line)
-        head_is_verbalish  = is_verbalish(head or "")
-        head_is_nominalish = head_pos_is(head, {"NOUN", "PROPN", "PRON", "ADJ", "NUM"})
-        token_vnoun        = (feats.get("VerbForm") == "Vnoun")
-        token_has_clause_dep = bool(tid and has_clausal_dependent(tid, tokens))
-        head_has_clause_dep  = bool(hid and has_clausal_dependent(hid, tokens))
+        token_is_verbalish = is_verbalish(line, a)
+        head_is_verbalish  = is_verbalish(head or "", head_attrs)
+        head_is_nominalish = head_pos_is(head_attrs, NOMINALISH_POS)
+        token_vnoun        = (feat_value(a.get("FEAT"), "VerbForm") == "Vnoun")
+        token_has_clause_dep = bool(tid and has_clausal_dependent(tid, attrs, children))
+        head_has_clause_dep  = bool(hid and has_clausal_dependent(hid, attrs, children))
 
         new_rel: Optional[str] = None
 
         # 1) PROPN + head PROPN -> flat:name
-        if upos == "PROPN" and head_pos_is(head, {"PROPN"}):
+        if upos == "PROPN" and head_pos_is(head_attrs, PROPN_POS):
             new_rel = "flat:name"
 
         # 2) PROPN + has dependent lemma="anown" -> acl
-        elif upos == "PROPN" and tid and has_dependent_lemma(tid, tokens, "anown"):
+        elif upos == "PROPN" and tid and has_dependent_lemma(tid, attrs, children, "anown"):
             new_rel = "acl"
 
         # 3) acl condition 1
@@ -158,43 +153,36 @@ def process_sentence(block: str, verbose: bool = False) -> str:
         if verbose:
             print(
                 f'[apos->{new_rel}] id={tid or "?"} pos={upos} head={hid or "?"} '
-                f'headpos={get_attr(head or "", "part-of-speech") or "-"} '
+                f'headpos={head_attrs.get("part-of-speech") or "-"} '
                 f'verbalish={token_is_verbalish} head_verbalish={head_is_verbalish} '
                 f'vnoun={token_vnoun} token_clause_dep={token_has_clause_dep} head_clause_dep={head_has_clause_dep}'
             )
 
-        tokens[i] = set_attr(line, "relation", new_rel)
+        put(i, set_attr(line, "relation", new_rel))
 
     return "\n".join(tokens)
 
 # -------- File I/O & CLI --------
 
-def process_file(input_path: Path, output_path: Path, verbose: bool = False) -> None:
-    text = input_path.read_text(encoding="utf-8")
+def _process_part(part: str, verbose: bool = False) -> str:
+    blk = part.strip()
+    return process_sentence(blk, verbose=verbose) if blk else part
 
-    # Accept either "\n</sentence>" or bare "</sentence>" as separators
-    if "\n</sentence>" in text:
-        parts = text.split("\n</sentence>")
-        sep = "\n</sentence>"
-    else:
-        parts = text.split("</sentence>")
-        sep = "</sentence>"
-
-    for i, part in enumerate(parts):
-        blk = part.strip()
-        if not blk:
-            continue
-        parts[i] = process_sentence(blk, verbose=verbose)
+def process_text(text: str, verbose: bool = False, jobs: int = 1) -> str:
+    """Transform a whole file's text in memory (same result as process_file)."""
+    return rewrite_text(text, _process_part, jobs, verbose)
 
-    output_path.write_text(sep.join(parts), encoding="utf-8")
+def process_file(input_path: Path, output_path: Path, verbose: bool = False, jobs: int = 1) -> None:
+    rewrite_file(input_path, output_path, _process_part, jobs, verbose)
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Stage 24: refine relation='apos' into UD labels.")
     ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
     ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
     ap.add_argument("--verbose", action="store_true", help="Print decision logs")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes (0 = all cores; default 1)")
     args = ap.parse_args()
-    process_file(args.inp, args.out, verbose=args.verbose)
+    process_file(args.inp, args.out, verbose=args.verbose, jobs=args.jobs)
 
 if __name__ == "__main__":
     main()
@@ -17,48 +17,29 @@ CLI
 from __future__ import annotations
 
 import argparse
-import re
 from pathlib import Path
-from typing import Optional
+from typing import List
 
-# ---------------- Attribute helpers ----------------
-
-def get_attr(line: str, name: str) -> Optional[str]:
-    m = re.search(fr'\b{name}="([^"]*)"', line)
-    return m.group(1) if m else None
-
-def has_attr(line: str, name: str) -> bool:
-    return bool(re.search(fr'\b{name}="', line))
-
-def set_attr(line: str, name: str, value: str) -> str:
-    """Set or replace XML-like attribute name="value" on a token line."""
-    if has_attr(line, name):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    # Insert before '/>' or '>'
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
+from _attr_utils import get_attr, set_attr
 
 # ---------------- Core mapping ----------------
 
+# POS -> refined relation; anything else becomes advmod
+AUX_REL_BY_POS = {
+    "DET":  "det",
+    "INTJ": "discourse",
+    "AUX":  "aux",  # explicit, no change
+}
+
 def refine_aux_relation(line: str, verbose: bool = False) -> str:
+    if 'relation="aux"' not in line:   # cheap reject before the regex lookup
+        return line
     rel = get_attr(line, "relation")
     if rel != "aux":
         return line
 
     upos = get_attr(line, "part-of-speech") or ""
-    new_rel = None
-
-    if upos == "DET":
-        new_rel = "det"
-    elif upos == "INTJ":
-        new_rel = "discourse"
-    elif upos == "AUX":
-        new_rel = "aux"  # explicit, no change
-    else:
-        new_rel = "advmod"
+    new_rel = AUX_REL_BY_POS.get(upos, "advmod")
 
     if verbose:
         tid = get_attr(line, "id") or "?"
@@ -68,12 +49,34 @@ def refine_aux_relation(line: str, verbose: bool = False) -> str:
 
 # ---------------- File I/O & CLI ----------------
 
+TARGET = 'relation="aux"'
+
+def process_text(text: str, verbose: bool = False) -> str:
+    """
+    Transform a whole file's text in memory. Only lines holding TARGET can
+    change, so a find cursor jumps from one such line to the next and the text
+    in between is copied through as is.
+    """
+    out: List[str] = []
+    pos = 0
+    while True:
+        k = text.find(TARGET, pos)
+        if k < 0:
+            break
+        start = text.rfind("\n", 0, k) + 1
+        end = text.find("\n", k)
+        if end < 0:
+            end = len(text)
+        out.append(text[pos:start])
+        out.append(refine_aux_relation(text[start:end], verbose=verbose))
+        pos = end
+    out.append(text[pos:])
+    return "".join(out)
+
 def process_file(input_path: Path, output_path: Path, verbose: bool = False) -> None:
-    with input_path.open("r", encoding="utf-8") as infile, output_path.open("w", encoding="utf-8") as outfile:
-        for raw in infile:
-            line = raw.rstrip("\n")
-            line = refine_aux_relation(line, verbose=verbose)
-            outfile.write(line if raw.endswith("\n") else line + "\n")
+    # Whole-file read and write instead of one write call per line
+    text = input_path.read_text(encoding="utf-8")
+    output_path.write_text(process_text(text, verbose=verbose), encoding="utf-8")
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Stage 25: refine relation='aux' using part-of-speech.")
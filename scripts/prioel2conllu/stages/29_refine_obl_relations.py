@@ -28,38 +28,11 @@ CLI
 from __future__ import annotations
 
 import argparse
-import re
 from pathlib import Path
-from typing import Dict, List, Optional
-
-# ---------- Attribute helpers ----------
-
-def get_attr(line: str, name: str) -> Optional[str]:
-    m = re.search(fr'\b{name}="([^"]*)"', line)
-    return m.group(1) if m else None
-
-def has_attr(line: str, name: str) -> bool:
-    return bool(re.search(fr'\b{name}="', line))
-
-def set_attr(line: str, name: str, value: str) -> str:
-    """Set or replace XML-like attribute name="value" on a token line."""
-    if has_attr(line, name):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
-
-def parse_feats(s: Optional[str]) -> Dict[str, str]:
-    if not s or s == "_":
-        return {}
-    out: Dict[str, str] = {}
-    for kv in s.split("|"):
-        if "=" in kv:
-            k, v = kv.split("=", 1)
-            out[k] = v
-    return out
+from typing import List, Optional, Set
+
+from _attr_utils import feat_value, get_attr, set_attr, value_start
+from _stage_io import rejoin, rewrite_file, rewrite_text
 
 # ---------- Core per-sentence transform ----------
 
@@ -67,35 +40,33 @@ def process_sentence(block: str, verbose: bool = False) -> str:
     """
     Process one sentence (block without trailing </sentence>).
     """
+    if 'relation="obl"' not in block:
+        return rejoin(block)
     tokens: List[str] = block.splitlines()
+    modified = False
 
-    # Build indices for quick lookup
-    id2idx: Dict[str, int] = {}
-    children: Dict[str, List[int]] = {}
-    for i, line in enumerate(tokens):
-        tid = get_attr(line, "id")
-        if tid:
-            id2idx[tid] = i
-        hid = get_attr(line, "head-id")
-        if hid:
-            children.setdefault(hid, []).append(i)
+    # One column per attribute read across tokens, one scan each; an obl
+    # token's own id and FEAT are read when it is reached. Only `relation` is
+    # rewritten below, and never read back for another token.
+    rels      = [get_attr(t, "relation") for t in tokens]
+    head_ids  = [get_attr(t, "head-id") for t in tokens]
+    pos_tags  = [get_attr(t, "part-of-speech") for t in tokens]
+
+    # Heads with at least one ADP dependent, collected in one pass
+    adp_heads: Set[str] = {hid for hid, pos in zip(head_ids, pos_tags) if hid and pos == "ADP"}
 
     for i, line in enumerate(tokens):
-        if get_attr(line, "relation") != "obl":
+        if rels[i] != "obl":
             continue
 
         tid   = get_attr(line, "id") or ""
-        upos  = get_attr(line, "part-of-speech") or ""
-        feats = parse_feats(get_attr(line, "FEAT"))
-        case  = feats.get("Case")
+        upos  = pos_tags[i] or ""
+        feat  = get_attr(line, "FEAT")
+        case  = feat_value(feat, "Case")
         empty_p = 'empty-token-sort="P"' in line
 
         # Does this token have any ADP dependents (within this sentence)?
-        has_adp_child = False
-        for j in children.get(tid, []):
-            if get_attr(tokens[j], "part-of-speech") == "ADP":
-                has_adp_child = True
-                break
+        has_adp_child = tid in adp_heads
 
         # Apply the decision tree
         new_rel: Optional[str] = None
@@ -103,45 +74,45 @@ def process_sentence(block: str, verbose: bool = False) -> str:
             new_rel = "iobj"
         elif upos == "ADV":
             new_rel = "advmod"
-        elif upos in {"NOUN", "PROPN", "PRON", "DET", "ADJ", "NUM"} or feats.get("VerbForm") == "Vnoun" or empty_p:
+        elif upos in {"NOUN", "PROPN", "PRON", "DET", "ADJ", "NUM"} or feat_value(feat, "VerbForm") == "Vnoun" or empty_p:
             new_rel = "obl"      # keep as-is
         else:
             new_rel = "advcl"
 
         if verbose:
-            print(f'[obl->{new_rel}] id={tid or "?"} pos={upos} case={case or "-"} adpdep={has_adp_child} vnoun={feats.get("VerbForm")=="Vnoun"} emptyP={empty_p}')
+            print(f'[obl->{new_rel}] id={tid or "?"} pos={upos} case={case or "-"} adpdep={has_adp_child} vnoun={feat_value(feat, "VerbForm")=="Vnoun"} emptyP={empty_p}')
+
+        # Keeping obl leaves the line as is, unless set_attr would write to an
+        # earlier `relation="` inside a longer attribute name
+        if new_rel == "obl" and line.find('relation="') + len('relation="') == value_start(line, "relation"):
+            continue
 
         tokens[i] = set_attr(line, "relation", new_rel)
+        modified = True
 
-    return "\n".join(tokens)
+    return "\n".join(tokens) if modified else rejoin(block)
 
 # ---------- File I/O & CLI ----------
 
-def process_file(input_path: Path, output_path: Path, verbose: bool = False) -> None:
-    text = input_path.read_text(encoding="utf-8")
-
-    if "\n</sentence>" in text:
-        parts = text.split("\n</sentence>")
-        sep = "\n</sentence>"
-    else:
-        parts = text.split("</sentence>")
-        sep = "</sentence>"
+def _process_part(part: str, verbose: bool = False) -> str:
+    blk = part.strip()
+    return process_sentence(blk, verbose=verbose) if blk else part
 
-    for i, part in enumerate(parts):
-        blk = part.strip()
-        if not blk:
-            continue
-        parts[i] = process_sentence(blk, verbose=verbose)
+def process_text(text: str, verbose: bool = False, jobs: int = 1) -> str:
+    """Transform a whole file's text in memory (same result as process_file)."""
+    return rewrite_text(text, _process_part, jobs, verbose)
 
-    output_path.write_text(sep.join(parts), encoding="utf-8")
+def process_file(input_path: Path, output_path: Path, verbose: bool = False, jobs: int = 1) -> None:
+    rewrite_file(input_path, output_path, _process_part, jobs, verbose)
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Stage 29: refine relation='obl' into iobj/advmod/advcl (or keep obl).")
     ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
     ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
     ap.add_argument("--verbose", action="store_true", help="Print decision logs")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes (0 = all cores; default 1)")
     args = ap.parse_args()
-    process_file(args.inp, args.out, verbose=args.verbose)
+    process_file(args.inp, args.out, verbose=args.verbose, jobs=args.jobs)
 
 if __name__ == "__main__":
     main()
@@ -21,28 +21,11 @@ CLI
 from __future__ import annotations
 
 import argparse
-import re
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import List, Set
 
-# -------- Attribute helpers --------
-
-def get_attr(line: str, name: str) -> Optional[str]:
-    m = re.search(fr'\b{name}="([^"]*)"', line)
-    return m.group(1) if m else None
-
-def has_attr(line: str, name: str) -> bool:
-    return bool(re.search(fr'\b{name}="', line))
-
-def set_attr(line: str, name: str, value: str) -> str:
-    """Set or replace XML-like attribute name="value" on a token line."""
-    if has_attr(line, name):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
+from _attr_utils import get_attr, set_attr
+from _stage_io import rejoin, rewrite_file, rewrite_text
 
 # -------- Per-sentence processing --------
 
@@ -50,25 +33,27 @@ def process_sentence(block: str, verbose: bool = False) -> str:
     """
     Process one sentence block (without the trailing </sentence>).
     """
+    if 'relation="part"' not in block:
+        return rejoin(block)
     tokens: List[str] = block.splitlines()
+    modified = False
 
-    # Build id -> children index
-    children: Dict[str, List[int]] = {}
-    for idx, line in enumerate(tokens):
-        hid = get_attr(line, "head-id")
-        if hid:
-            children.setdefault(hid, []).append(idx)
+    # One column per attribute read across tokens, one scan each (only
+    # `relation` is rewritten, and only on the token being visited)
+    rels     = [get_attr(t, "relation") for t in tokens]
+    head_ids = [get_attr(t, "head-id") for t in tokens]
+    pos_tags = [get_attr(t, "part-of-speech") for t in tokens]
+
+    # Heads with at least one ADP dependent, collected in one pass
+    adp_heads: Set[str] = {hid for hid, pos in zip(head_ids, pos_tags) if hid and pos == "ADP"}
 
     for i, line in enumerate(tokens):
-        if get_attr(line, "relation") != "part":
+        if rels[i] != "part":
             continue
 
         tid = get_attr(line, "id") or ""
         # Does this token have an ADP child?
-        has_adp_child = any(
-            get_attr(tokens[j], "part-of-speech") == "ADP"
-            for j in children.get(tid, [])
-        )
+        has_adp_child = tid in adp_heads
 
         new_rel = "obl" if has_adp_child else "nmod"
 
@@ -76,37 +61,31 @@ def process_sentence(block: str, verbose: bool = False) -> str:
             print(f'[part->{new_rel}] id={tid or "?"} adp_child={has_adp_child}')
 
         tokens[i] = set_attr(line, "relation", new_rel)
+        modified = True
 
-    return "\n".join(tokens)
+    return "\n".join(tokens) if modified else rejoin(block)
 
 # -------- File I/O & CLI --------
 
-def process_file(input_path: Path, output_path: Path, verbose: bool = False) -> None:
-    text = input_path.read_text(encoding="utf-8")
-
-    # Accept either "\n</sentence>" or bare "</sentence>" as separator
-    if "\n</sentence>" in text:
-        parts = text.split("\n</sentence>")
-        sep = "\n</sentence>"
-    else:
-        parts = text.split("</sentence>")
-        sep = "</sentence>"
+def _process_part(part: str, verbose: bool = False) -> str:
+    blk = part.strip()
+    return process_sentence(blk, verbose=verbose) if blk else part
 
-    for idx, part in enumerate(parts):
-        blk = part.strip()
-        if not blk:
-            continue
-        parts[idx] = process_sentence(blk, verbose=verbose)
+def process_text(text: str, verbose: bool = False, jobs: int = 1) -> str:
+    """Transform a whole file's text in memory (same result as process_file)."""
+    return rewrite_text(text, _process_part, jobs, verbose)
 
-    output_path.write_text(sep.join(parts), encoding="utf-8")
+def process_file(input_path: Path, output_path: Path, verbose: bool = False, jobs: int = 1) -> None:
+    rewrite_file(input_path, output_path, _process_part, jobs, verbose)
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Stage 30: refine relation='part' into obl/nmod.")
     ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
     ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
     ap.add_argument("--verbose", action="store_true", help="Print decision logs")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes (0 = all cores; default 1)")
     args = ap.parse_args()
-    process_file(args.inp, args.out, verbose=args.verbose)
+    process_file(args.inp, args.out, verbose=args.verbose, jobs=args.jobs)
 
 if __name__ == "__main__":
     main()
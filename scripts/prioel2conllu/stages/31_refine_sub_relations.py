@@ -24,38 +24,11 @@ CLI
 from __future__ import annotations
 
 import argparse
-import re
 from pathlib import Path
-from typing import Dict, List, Optional
-
-# ---------- Attribute helpers ----------
-
-def get_attr(line: str, name: str) -> Optional[str]:
-    m = re.search(fr'\b{name}="([^"]*)"', line)
-    return m.group(1) if m else None
-
-def has_attr(line: str, name: str) -> bool:
-    return bool(re.search(fr'\b{name}="', line))
-
-def set_attr(line: str, name: str, value: str) -> str:
-    """Set or replace XML-like attribute name="value" on a token line."""
-    if has_attr(line, name):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
-
-def parse_feats(s: Optional[str]) -> Dict[str, str]:
-    if not s or s == "_":
-        return {}
-    out: Dict[str, str] = {}
-    for kv in s.split("|"):
-        if "=" in kv:
-            k, v = kv.split("=", 1)
-            out[k] = v
-    return out
+from typing import Dict, List, Optional, Set
+
+from _attr_utils import feat_value, get_attr, set_attr
+from _stage_io import rejoin, rewrite_file, rewrite_text
 
 # ---------- Per-sentence processing ----------
 
@@ -63,43 +36,43 @@ def process_sentence(block: str, verbose: bool = False) -> str:
     """
     Process one sentence block (without the trailing </sentence>).
     """
+    if 'relation="sub"' not in block:
+        return rejoin(block)
     tokens: List[str] = block.splitlines()
+    modified = False
+
+    # One column per attribute read across tokens, one scan each. Only
+    # `relation` is rewritten below, and the values written
+    # (nsubj/iobj/obl/csubj) are never the `cop` looked for.
+    rels     = [get_attr(t, "relation") for t in tokens]
+    ids      = [get_attr(t, "id") for t in tokens]
+    head_ids = [get_attr(t, "head-id") for t in tokens]
 
-    # Build indices and children map
+    # Build id index, and the heads with a `cop` dependent in the same pass
     id2idx: Dict[str, int] = {}
-    children: Dict[str, List[int]] = {}
-    for i, line in enumerate(tokens):
-        tid = get_attr(line, "id")
+    cop_heads: Set[str] = set()
+    for i, (tid, hid) in enumerate(zip(ids, head_ids)):
         if tid:
             id2idx[tid] = i
-        hid = get_attr(line, "head-id")
-        if hid:
-            children.setdefault(hid, []).append(i)
-
-    def has_child_with_relation(tid: Optional[str], rel: str) -> bool:
-        if not tid:
-            return False
-        for j in children.get(tid, []):
-            if get_attr(tokens[j], "relation") == rel:
-                return True
-        return False
+        if hid and rels[i] == "cop":
+            cop_heads.add(hid)
 
     for i, line in enumerate(tokens):
-        if get_attr(line, "relation") != "sub":
+        if rels[i] != "sub":
             continue
 
-        tid   = get_attr(line, "id")
-        feats = parse_feats(get_attr(line, "FEAT"))
-        hid   = get_attr(line, "head-id")
+        tid   = ids[i]
+        feat  = get_attr(line, "FEAT")
+        hid   = head_ids[i]
         head  = tokens[id2idx[hid]] if (hid and hid in id2idx) else None
-        hfeats = parse_feats(get_attr(head or "", "FEAT"))
+        hfeat = get_attr(head, "FEAT") if head else None
 
-        case      = feats.get("Case")
-        vform     = feats.get("VerbForm")
-        head_vf   = hfeats.get("VerbForm")
-        head_case = hfeats.get("Case")
+        case      = feat_value(feat, "Case")
+        vform     = feat_value(feat, "VerbForm")
+        head_vf   = feat_value(hfeat, "VerbForm")
+        head_case = feat_value(hfeat, "Case")
         empty_v   = 'empty-token-sort="V"' in line
-        has_cop_child = has_child_with_relation(tid, "cop")
+        has_cop_child = bool(tid) and tid in cop_heads
 
         new_rel: Optional[str] = None
 
@@ -131,37 +104,31 @@ def process_sentence(block: str, verbose: bool = False) -> str:
             )
 
         tokens[i] = set_attr(line, "relation", new_rel)
+        modified = True
 
-    return "\n".join(tokens)
+    return "\n".join(tokens) if modified else rejoin(block)
 
 # ---------- File I/O & CLI ----------
 
-def process_file(input_path: Path, output_path: Path, verbose: bool = False) -> None:
-    text = input_path.read_text(encoding="utf-8")
+def _process_part(part: str, verbose: bool = False) -> str:
+    blk = part.strip()
+    return process_sentence(blk, verbose=verbose) if blk else part
 
-    # Support both "\n</sentence>" and bare "</sentence>"
-    if "\n</sentence>" in text:
-        parts = text.split("\n</sentence>")
-        sep = "\n</sentence>"
-    else:
-        parts = text.split("</sentence>")
-        sep = "</sentence>"
-
-    for idx, part in enumerate(parts):
-        blk = part.strip()
-        if not blk:
-            continue
-        parts[idx] = process_sentence(blk, verbose=verbose)
+def process_text(text: str, verbose: bool = False, jobs: int = 1) -> str:
+    """Transform a whole file's text in memory (same result as process_file)."""
+    return rewrite_text(text, _process_part, jobs, verbose)
 
-    output_path.write_text(sep.join(parts), encoding="utf-8")
+def process_file(input_path: Path, output_path: Path, verbose: bool = False, jobs: int = 1) -> None:
+    rewrite_file(input_path, output_path, _process_part, jobs, verbose)
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Stage 31: refine relation='sub' into nsubj/iobj/obl/csubj.")
     ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
     ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
     ap.add_argument("--verbose", action="store_true", help="Print decision logs")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes (0 = all cores; default 1)")
     args = ap.parse_args()
-    process_file(args.inp, args.out, verbose=args.verbose)
+    process_file(args.inp, args.out, verbose=args.verbose, jobs=args.jobs)
 
 if __name__ == "__main__":
     main()
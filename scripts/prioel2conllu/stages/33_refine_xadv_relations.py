@@ -25,38 +25,11 @@ CLI
 from __future__ import annotations
 
 import argparse
-import re
 from pathlib import Path
-from typing import Dict, List, Optional
-
-# ---------- Attribute helpers ----------
-
-def get_attr(line: str, name: str) -> Optional[str]:
-    m = re.search(fr'\b{name}="([^"]*)"', line)
-    return m.group(1) if m else None
-
-def has_attr(line: str, name: str) -> bool:
-    return bool(re.search(fr'\b{name}="', line))
-
-def set_attr(line: str, name: str, value: str) -> str:
-    """Set or replace XML-like attribute name="value" on a token line."""
-    if has_attr(line, name):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
-
-def parse_feats(s: Optional[str]) -> Dict[str, str]:
-    if not s or s == "_":
-        return {}
-    out: Dict[str, str] = {}
-    for kv in s.split("|"):
-        if "=" in kv:
-            k, v = kv.split("=", 1)
-            out[k] = v
-    return out
+from typing import List, Set
+
+from _attr_utils import feat_value, get_attr, set_attr
+from _stage_io import rejoin, rewrite_file, rewrite_text
 
 # ---------- Per-sentence processing ----------
 
@@ -64,36 +37,37 @@ def process_sentence(block: str, verbose: bool = False) -> str:
     """
     Process a sentence block (without the trailing </sentence>).
     """
+    if 'relation="xadv"' not in block:
+        return rejoin(block)
     tokens: List[str] = block.splitlines()
-
-    # Build id -> children index
-    id2children: Dict[str, List[int]] = {}
-    for idx, t in enumerate(tokens):
-        hid = get_attr(t, "head-id")
-        if hid:
-            id2children.setdefault(hid, []).append(idx)
+    modified = False
+
+    # One column per attribute read across tokens, one scan each; the rest is
+    # read from the few lines that need it. Only `relation` is rewritten
+    # below, and the values written (xcomp/advcl/advmod) are never the
+    # cop/mark looked for.
+    rels     = [get_attr(t, "relation") for t in tokens]
+    head_ids = [get_attr(t, "head-id") for t in tokens]
+
+    # Heads with a clausal dependent: relation cop/mark, or FEAT PronType=Rel
+    # (the substring test spares the FEAT lookup on almost every line)
+    clause_dep_heads: Set[str] = {
+        hid for hid, rel, t in zip(head_ids, rels, tokens)
+        if hid and (rel in {"cop", "mark"} or (
+            "PronType=Rel" in t and feat_value(get_attr(t, "FEAT"), "PronType") == "Rel"))
+    }
 
     for i, line in enumerate(tokens):
-        if get_attr(line, "relation") != "xadv":
+        if rels[i] != "xadv":
             continue
 
         tid   = get_attr(line, "id") or ""
         upos  = get_attr(line, "part-of-speech") or ""
-        feats = parse_feats(get_attr(line, "FEAT"))
-        vform = feats.get("VerbForm")
+        vform = feat_value(get_attr(line, "FEAT"), "VerbForm")
         empty_v = 'empty-token-sort="V"' in line
 
         # Detect clausal dependents of this token
-        has_clause_dep = False
-        for j in id2children.get(tid, []):
-            rel_j = get_attr(tokens[j], "relation")
-            if rel_j in {"cop", "mark"}:
-                has_clause_dep = True
-                break
-            dep_feats = parse_feats(get_attr(tokens[j], "FEAT"))
-            if dep_feats.get("PronType") == "Rel":
-                has_clause_dep = True
-                break
+        has_clause_dep = tid in clause_dep_heads
 
         # Decision tree
         if vform == "Inf":
@@ -109,37 +83,31 @@ def process_sentence(block: str, verbose: bool = False) -> str:
             print(f'[xadv->{new_rel}] id={tid or "?"} pos={upos} vform={vform or "-"} emptyV={empty_v} clause_dep={has_clause_dep}')
 
         tokens[i] = set_attr(line, "relation", new_rel)
+        modified = True
 
-    return "\n".join(tokens)
+    return "\n".join(tokens) if modified else rejoin(block)
 
 # ---------- File I/O & CLI ----------
 
-def process_file(input_path: Path, output_path: Path, verbose: bool = False) -> None:
-    text = input_path.read_text(encoding="utf-8")
+def _process_part(part: str, verbose: bool = False) -> str:
+    blk = part.strip()
+    return process_sentence(blk, verbose=verbose) if blk else part
 
-    # Accept either "\n</sentence>" or bare "</sentence>" as separator
-    if "\n</sentence>" in text:
-        parts = text.split("\n</sentence>")
-        sep = "\n</sentence>"
-    else:
-        parts = text.split("</sentence>")
-        sep = "</sentence>"
-
-    for idx, part in enumerate(parts):
-        blk = part.strip()
-        if not blk:
-            continue
-        parts[idx] = process_sentence(blk, verbose=verbose)
+def process_text(text: str, verbose: bool = False, jobs: int = 1) -> str:
+    """Transform a whole file's text in memory (same result as process_file)."""
+    return rewrite_text(text, _process_part, jobs, verbose)
 
-    output_path.write_text(sep.join(parts), encoding="utf-8")
+def process_file(input_path: Path, output_path: Path, verbose: bool = False, jobs: int = 1) -> None:
+    rewrite_file(input_path, output_path, _process_part, jobs, verbose)
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Stage 33: refine relation='xadv' into xcomp/advmod/advcl.")
     ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
     ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
     ap.add_argument("--verbose", action="store_true", help="Print decision logs")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes (0 = all cores; default 1)")
     args = ap.parse_args()
-    process_file(args.inp, args.out, verbose=args.verbose)
+    process_file(args.inp, args.out, verbose=args.verbose, jobs=args.jobs)
 
 if __name__ == "__main__":
     main()
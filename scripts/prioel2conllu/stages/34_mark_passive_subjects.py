@@ -23,28 +23,11 @@ CLI
 from __future__ import annotations
 
 import argparse
-import re
 from pathlib import Path
-from typing import List, Optional, Set
+from typing import List, Set
 
-# ---------- Attribute helpers ----------
-
-def get_attr(line: str, name: str) -> Optional[str]:
-    m = re.search(fr'\b{name}="([^"]*)"', line)
-    return m.group(1) if m else None
-
-def has_attr(line: str, name: str) -> bool:
-    return bool(re.search(fr'\b{name}="', line))
-
-def set_attr(line: str, name: str, value: str) -> str:
-    """Set or replace XML-like attribute name="value" on a token line."""
-    if has_attr(line, name):
-        return re.sub(fr'({name}=")[^"]*(")', frf'\1{value}\2', line, count=1)
-    if "/>" in line:
-        return re.sub(r'\s*/>', f' {name}="{value}" />', line, count=1)
-    if ">" in line:
-        return re.sub(r'>', f' {name}="{value}">', line, count=1)
-    return f'{line} {name}="{value}"'
+from _attr_utils import get_attr, set_attr
+from _stage_io import rejoin, rewrite_file, rewrite_text
 
 # ---------- Per-sentence processing ----------
 
@@ -52,62 +35,57 @@ def process_sentence(block: str, verbose: bool = False) -> str:
     """
     Process one sentence (block without trailing </sentence>).
     """
+    if 'relation="obl:agent"' not in block or (
+            'relation="nsubj"' not in block and 'relation="csubj"' not in block):
+        return rejoin(block)
     tokens: List[str] = block.splitlines()
+    rels     = [get_attr(t, "relation") for t in tokens]
+    head_ids = [get_attr(t, "head-id") for t in tokens]
 
     # 1) Collect heads that have an obl:agent dependent
-    heads_with_agent: Set[str] = set()
-    for tok in tokens:
-        if get_attr(tok, "relation") == "obl:agent":
-            hid = get_attr(tok, "head-id")
-            if hid:
-                heads_with_agent.add(hid)
+    heads_with_agent: Set[str] = {hid for rel, hid in zip(rels, head_ids) if hid and rel == "obl:agent"}
 
     if not heads_with_agent:
-        return "\n".join(tokens)
+        return rejoin(block)
 
     # 2) Relabel subjects headed by those heads
+    modified = False
     for i, tok in enumerate(tokens):
-        rel = get_attr(tok, "relation")
+        rel = rels[i]
         if rel not in {"nsubj", "csubj"}:
             continue
-        hid = get_attr(tok, "head-id")
+        hid = head_ids[i]
         if hid and hid in heads_with_agent:
             new_rel = "nsubj:pass" if rel == "nsubj" else "csubj:pass"
             if verbose:
                 tid = get_attr(tok, "id") or "?"
                 print(f'[subj->{new_rel}] id={tid} head={hid}')
             tokens[i] = set_attr(tok, "relation", new_rel)
+            modified = True
 
-    return "\n".join(tokens)
+    return "\n".join(tokens) if modified else rejoin(block)
 
 # ---------- File I/O & CLI ----------
 
-def process_file(input_path: Path, output_path: Path, verbose: bool = False) -> None:
-    text = input_path.read_text(encoding="utf-8")
+def _process_part(part: str, verbose: bool = False) -> str:
+    blk = part.strip()
+    return process_sentence(blk, verbose=verbose) if blk else part
 
-    # Accept either "\n</sentence>" or bare "</sentence>" as separator
-    if "\n</sentence>" in text:
-        parts = text.split("\n</sentence>")
-        sep = "\n</sentence>"
-    else:
-        parts = text.split("</sentence>")
-        sep = "</sentence>"
-
-    for idx, part in enumerate(parts):
-        blk = part.strip()
-        if not blk:
-            continue
-        parts[idx] = process_sentence(blk, verbose=verbose)
+def process_text(text: str, verbose: bool = False, jobs: int = 1) -> str:
+    """Transform a whole file's text in memory (same result as process_file)."""
+    return rewrite_text(text, _process_part, jobs, verbose)
 
-    output_path.write_text(sep.join(parts), encoding="utf-8")
+def process_file(input_path: Path, output_path: Path, verbose: bool = False, jobs: int = 1) -> None:
+    rewrite_file(input_path, output_path, _process_part, jobs, verbose)
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Stage 34: mark passive subjects using obl:agent presence.")
     ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
     ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
     ap.add_argument("--verbose", action="store_true", help="Print decision logs")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes (0 = all cores; default 1)")
     args = ap.parse_args()
-    process_file(args.inp, args.out, verbose=args.verbose)
+    process_file(args.inp, args.out, verbose=args.verbose, jobs=args.jobs)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Shared attribute helpers for the line-based stage scripts (10–34).
+
+PURPOSE
+    Read and edit the XML-like `name="value"` attributes of a token line with
+    plain str.find scans. The lookups match what the regex `\\bname="([^"]*)"`
+    finds, so every stage sees the same attribute a regex search would.
+
+    - `get_attr` / `has_attr` / `set_attr` / `remove_attr`: single attributes.
+    - `parse_attrs`: every attribute of a line at once, for stages that read
+      several attributes of every token.
+    - `parse_feats` / `feats_to_str` / `feat_value`: the `A=B|C=D` FEAT value.
+
+USAGE
+    A stage run by path has this directory as sys.path[0], so it imports the
+    module by name:
+        from _attr_utils import get_attr, set_attr
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, Optional
+
+# ---------- Single attributes ----------
+
+def value_start(line: str, name: str) -> int:
+    """
+    Index just past the first `name="` that starts on a word boundary (what
+    `\\bname="` matches), or -1. Plain str.find does the scanning.
+    """
+    needle = name + '="'
+    i = line.find(needle)
+    while i > 0 and (line[i - 1].isalnum() or line[i - 1] == "_"):
+        i = line.find(needle, i + 1)
+    return i if i < 0 else i + len(needle)
+
+def get_attr(line: str, name: str) -> Optional[str]:
+    vs = value_start(line, name)
+    if vs < 0:
+        return None
+    ve = line.find('"', vs)
+    return line[vs:ve] if ve >= 0 else None
+
+def has_attr(line: str, name: str) -> bool:
+    return value_start(line, name) >= 0
+
+def set_attr(line: str, name: str, value: str) -> str:
+    """
+    Set or replace XML-like attribute name="value" on a token line. An existing
+    value is replaced at the first `name="`, which (as in the stages' original
+    regex substitution) is not boundary-checked. A new attribute is inserted
+    before '/>' or '>', or appended.
+    """
+    needle = name + '="'
+    if value_start(line, name) >= 0:
+        vs = line.find(needle) + len(needle)
+        ve = line.find('"', vs)
+        return line if ve < 0 else line[:vs] + value + line[ve:]
+    k = line.find("/>")
+    if k >= 0:
+        return line[:k].rstrip() + f' {name}="{value}" />' + line[k + 2:]
+    k = line.find(">")
+    if k >= 0:
+        return line[:k] + f' {name}="{value}">' + line[k + 1:]
+    return f'{line} {name}="{value}"'
+
+def remove_attr(line: str, name: str) -> str:
+    """Remove the first occurrence of an attribute entirely."""
+    vs = value_start(line, name)
+    if vs < 0:
+        return line
+    ve = line.find('"', vs)
+    if ve < 0:
+        return line
+    # Leading whitespace goes with the attribute
+    start = len(line[:vs - len(name) - 2].rstrip())
+    return line[:start] + line[ve + 1:]
+
+# ---------- All attributes of a line ----------
+
+# One scan over all `name="value"` pairs of a line; stages that read several
+# attributes per token use these dicts instead of one lookup per attribute.
+ATTR_RE = re.compile(r'\b([A-Za-z_][\w-]*)="([^"]*)"')
+
+def parse_attrs(line: str) -> Dict[str, str]:
+    """
+    Map every attribute of `line` to its value, first occurrence winning.
+    A `\\bid="` lookup also matches inside "head-id" (\\b after '-'), so a
+    hyphenated name is entered under each hyphen suffix too, in scan order.
+    """
+    attrs: Dict[str, str] = {}
+    for m in ATTR_RE.finditer(line):
+        name, value = m.group(1), m.group(2)
+        attrs.setdefault(name, value)
+        while "-" in name:
+            name = name.split("-", 1)[1]
+            attrs.setdefault(name, value)
+    return attrs
+
+# ---------- FEAT values ----------
+
+def parse_feats(s: Optional[str]) -> Dict[str, str]:
+    if not s or s == "_":
+        return {}
+    out: Dict[str, str] = {}
+    for kv in s.split("|"):
+        if "=" in kv:
+            k, v = kv.split("=", 1)
+            out[k] = v
+    return out
+
+# Canonical (codepoint-sorted) order of the FEAT keys the stages emit, so
+# serialization is a single ordered pass instead of a sort per token. Any key
+# outside this set falls back to sorted(), which yields the same order.
+FEAT_ORDER = (
+    "Animacy", "Aspect", "Case", "Definite", "Mood", "NumType", "Number",
+    "Person", "Polarity", "Poss", "PronType", "Reflex", "Tense", "VerbForm",
+    "Voice",
+)
+FEAT_ORDER_SET = frozenset(FEAT_ORDER)
+
+def feats_to_str(d: Dict[str, str]) -> str:
+    """Serialize a FEAT dict back to a string in sorted key order; '_' if empty."""
+    if not d:
+        return "_"
+    if d.keys() <= FEAT_ORDER_SET:
+        return "|".join([f"{k}={d[k]}" for k in FEAT_ORDER if k in d])
+    return "|".join(f"{k}={d[k]}" for k in sorted(d))
+
+def feat_value(s: Optional[str], key: str) -> Optional[str]:
+    """
+    `parse_feats(s).get(key)` without building the dict: the last `key=value`
+    entry wins, as it does there. A find from the right does the scanning.
+    """
+    if not s or s == "_":
+        return None
+    needle = key + "="
+    i = len(s)
+    while True:
+        i = s.rfind(needle, 0, i)
+        if i < 0:
+            return None
+        if i == 0 or s[i - 1] == "|":
+            j = s.find("|", i)
+            return s[i + len(needle):] if j < 0 else s[i + len(needle):j]
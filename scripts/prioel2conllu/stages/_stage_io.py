@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+Shared I/O helpers for the stage scripts and the fused drivers.
+
+PURPOSE
+    Keep the file-reading machinery that several stages use in one place, so a
+    fix to it is made once. The stage logic itself stays in the stage scripts.
+
+    - `mapped_lines`: line-indexed mmap view (stages 06/07).
+    - `rewrite_text` / `rewrite_file`: split a text into sentence parts on
+      "</sentence>", run a stage's part transform over each (optionally in a
+      process pool, --jobs) and join the results back, streaming the file one
+      sentence at a time. `rewrite_lines` does the same line by line.
+    - `rejoin`: normalize a sentence block's line breaks the way the stages'
+      `"\\n".join(block.splitlines())` does, without copying when it is a no-op.
+    - `load_stage` / `apply_per_sentence`: load stage scripts by file name and
+      chain their sentence transforms (the fused drivers).
+
+USAGE
+    A stage run by path (python stages/NN_x.py) has this directory as
+    sys.path[0], as do the fused drivers that load the stages, so the module is
+    imported by name:
+        from _stage_io import mapped_lines
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import io
+import mmap
+import re
+import sys
+from array import array
+from contextlib import contextmanager, redirect_stdout
+from functools import partial
+from multiprocessing import Pool
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+# ---------- Line-indexed input ----------
+
+# Line breaks as reading the file in text mode and calling str.splitlines()
+# finds them: "\r\n" and a bare "\r" become "\n" (universal newlines), and the
+# other separators str.splitlines() knows end a line but are kept as they are.
+# In UTF-8, U+0085 is \xc2\x85 and U+2028/U+2029 are \xe2\x80\xa8/\xa9.
+_LINE_BREAK_RE = re.compile(rb"\r\n?|[\n\x0b\x0c\x1c\x1d\x1e]|\xc2\x85|\xe2\x80[\xa8\xa9]")
+# Any line break other than a plain "\n"; without one, str.find on "\n" is enough.
+_OTHER_BREAK_RE = re.compile(rb"[\r\x0b\x0c\x1c\x1d\x1e]|\xc2\x85|\xe2\x80[\xa8\xa9]")
+
+class MappedLines(Sequence[bytes]):
+    """
+    Read-only line view over an mmap'ed file: one array of line-start offsets,
+    each line sliced out (keeping its line break) only when it is accessed.
+    Lines are split and "\\r\\n"/"\\r" endings turned into "\\n" as
+    `path.read_text().splitlines(keepends=True)` would do.
+    """
+
+    def __init__(self, buf: Union[mmap.mmap, bytes]) -> None:
+        self.buf = buf
+        offsets = array("q", [0])
+        if _OTHER_BREAK_RE.search(buf) is None:
+            pos = buf.find(b"\n")
+            while pos != -1:
+                offsets.append(pos + 1)
+                pos = buf.find(b"\n", pos + 1)
+        else:
+            offsets.extend(m.end() for m in _LINE_BREAK_RE.finditer(buf))
+        if offsets[-1] != len(buf):
+            offsets.append(len(buf))
+        self.offsets = offsets
+        self.has_cr = buf.find(b"\r") != -1
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def _line(self, start: int, end: int) -> bytes:
+        line = self.buf[start:end]
+        if self.has_cr:
+            if line.endswith(b"\r\n"):
+                return line[:-2] + b"\n"
+            if line.endswith(b"\r"):
+                return line[:-1] + b"\n"
+        return line
+
+    def __getitem__(self, i: int) -> bytes:  # type: ignore[override]
+        return self._line(self.offsets[i], self.offsets[i + 1])
+
+    def __iter__(self) -> Iterator[bytes]:
+        offsets = self.offsets
+        for i in range(len(offsets) - 1):
+            yield self._line(offsets[i], offsets[i + 1])
+
+@contextmanager
+def mapped_lines(path: Path) -> Iterator[MappedLines]:
+    """Open `path` read-only and yield its MappedLines (an empty file has no lines)."""
+    with path.open("rb") as f:
+        if path.stat().st_size == 0:
+            yield MappedLines(b"")  # mmap cannot map an empty file
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield MappedLines(buf)
+
+# ---------- Sentence streaming ----------
+
+SENT_END = "</sentence>"
+
+IO_BUFFER_SIZE = 1 << 20   # 1 MiB file buffers
+POOL_CHUNKSIZE = 64        # sentences handed to a worker at a time (--jobs > 1)
+LINE_CHUNKSIZE = 4096      # lines handed to a worker at a time (line-based stages)
+
+def iter_parts(lines: Iterable[str], sep: str) -> Iterator[str]:
+    """
+    Yield the pieces `"".join(lines).split(sep)` would give, one sentence at a
+    time. `sep` is "\n</sentence>" or a bare "</sentence>"; neither spans more
+    than one line break, so the text never has to be held whole.
+    """
+    acc: List[str] = []
+    if sep.startswith("\n"):
+        for line in lines:
+            # "\n</sentence>": a line opening with </sentence> after a newline
+            if line.startswith(SENT_END) and acc and acc[-1].endswith("\n"):
+                yield "".join(acc)[:-1]
+                rest = line[len(SENT_END):]
+                acc = [rest] if rest else []
+            else:
+                acc.append(line)
+    else:
+        for line in lines:
+            if SENT_END in line:
+                pieces = line.split(SENT_END)
+                acc.append(pieces[0])
+                yield "".join(acc)
+                yield from pieces[1:-1]
+                acc = [pieces[-1]]
+            else:
+                acc.append(line)
+    yield "".join(acc)
+
+def iter_split(text: str, sep: str) -> Iterator[str]:
+    """Yield the pieces of `text.split(sep)` lazily, with a find cursor."""
+    pos = 0
+    while True:
+        j = text.find(sep, pos)
+        if j < 0:
+            yield text[pos:]
+            return
+        yield text[pos:j]
+        pos = j + len(sep)
+
+def interleave(pieces: Iterable[str], sep: str) -> Iterator[str]:
+    """Yield `pieces` with `sep` between them (a streaming sep.join)."""
+    if not sep:
+        yield from pieces
+        return
+    first = True
+    for piece in pieces:
+        if not first:
+            yield sep
+        first = False
+        yield piece
+
+def text_sep(text: str) -> str:
+    """Split delimiter: "\n</sentence>" if `text` contains it, else bare </sentence>."""
+    return f"\n{SENT_END}" if f"\n{SENT_END}" in text else SENT_END
+
+def detect_sep(lines: Iterable[str]) -> str:
+    """`text_sep` for a text given as lines (e.g. an open file), without joining them."""
+    it = iter(lines)
+    next(it, None)   # the first line has no newline before it
+    return f"\n{SENT_END}" if any(line.startswith(SENT_END) for line in it) else SENT_END
+
+# Line breaks other than "\n" that str.splitlines() also splits on
+_OTHER_BREAK_STR_RE = re.compile('[\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]')
+
+def rejoin(block: str) -> str:
+    """
+    `"\\n".join(block.splitlines())` without the split and join when that is
+    `block` itself, i.e. unless it has another line break or a trailing one.
+    """
+    if block.endswith("\n") or _OTHER_BREAK_STR_RE.search(block):
+        return "\n".join(block.splitlines())
+    return block
+
+PartFn = Callable[..., str]
+
+def _run_verbose(process_part: PartFn, part: str) -> Tuple[str, str]:
+    """`process_part` in a worker with --verbose: return the messages for in-order printing."""
+    buf = io.StringIO()
+    with redirect_stdout(buf):
+        out = process_part(part, verbose=True)
+    return out, buf.getvalue()
+
+def _print_messages(results: Iterable[Tuple[str, str]]) -> Iterator[str]:
+    """Write each worker's captured messages to stdout, in input order, and pass the text on."""
+    for out, messages in results:
+        sys.stdout.write(messages)
+        yield out
+
+def iter_processed(parts: Iterable[str], join: str, process_part: PartFn, jobs: int = 1,
+                   verbose: bool = False, initializer: Optional[Callable[..., None]] = None,
+                   initargs: Tuple[Any, ...] = (), chunksize: int = POOL_CHUNKSIZE) -> Iterator[str]:
+    """
+    Yield `process_part(part)` for each of `parts`, with `join` between them.
+    With verbose, `process_part(part, verbose=True)` is called instead.
+
+    Sentences are independent, so with jobs != 1 they are fanned out to a
+    process pool (0 = all cores); `imap` keeps them in input order, and each
+    worker's --verbose messages are printed in that order too. `initializer`
+    sets up per-file state once per worker (and once here when jobs == 1).
+    `chunksize` parts are handed to a worker at a time.
+    """
+    if jobs == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        if verbose:
+            yield from interleave((process_part(part, verbose=True) for part in parts), join)
+        else:
+            yield from interleave(map(process_part, parts), join)
+        return
+    with Pool(jobs or None, initializer, initargs) as pool:
+        if verbose:
+            results = _print_messages(pool.imap(partial(_run_verbose, process_part), parts,
+                                                chunksize=chunksize))
+        else:
+            results = pool.imap(process_part, parts, chunksize=chunksize)
+        yield from interleave(results, join)
+
+def rewrite_text(text: str, process_part: PartFn, jobs: int = 1, verbose: bool = False,
+                 sep: Optional[str] = None, join: Optional[str] = None) -> str:
+    """
+    Split `text` on `sep` (default: `text_sep(text)`), run `process_part` over
+    every piece and join the results with `join` (default: `sep`).
+    """
+    sep = sep or text_sep(text)
+    return "".join(iter_processed(iter_split(text, sep), join or sep, process_part, jobs, verbose))
+
+def rewrite_file(input_path: Path, output_path: Path, process_part: PartFn, jobs: int = 1,
+                 verbose: bool = False, sep: Optional[str] = None, join: Optional[str] = None) -> None:
+    """
+    `rewrite_text` from one file to another, streamed one sentence at a time.
+    Without a fixed `sep` the input is read twice: once to pick the delimiter,
+    once to rewrite it.
+    """
+    with input_path.open("r", encoding="utf-8", buffering=IO_BUFFER_SIZE) as infile, \
+         output_path.open("w", encoding="utf-8", buffering=IO_BUFFER_SIZE) as outfile:
+        if sep is None:
+            sep = detect_sep(infile)
+            infile.seek(0)
+        outfile.writelines(iter_processed(iter_parts(infile, sep), join or sep, process_part, jobs, verbose))
+
+def _end_line(transform_line: Callable[[str], str], raw: str) -> str:
+    """`transform_line` on `raw` without its "\\n", with "\\n" added back."""
+    return transform_line(raw.rstrip("\n")) + "\n"
+
+def rewrite_lines(input_path: Path, output_path: Path, transform_line: Callable[[str], str],
+                  jobs: int = 1) -> None:
+    """
+    Write `transform_line(line)` for every line of `input_path`, each ending in
+    "\\n" (for the line-based stages 08/09). A line is far less work than a
+    sentence, so workers get LINE_CHUNKSIZE of them at a time.
+    """
+    with input_path.open("r", encoding="utf-8", buffering=IO_BUFFER_SIZE) as infile, \
+         output_path.open("w", encoding="utf-8", buffering=IO_BUFFER_SIZE) as outfile:
+        outfile.writelines(iter_processed(infile, "", partial(_end_line, transform_line), jobs,
+                                          chunksize=LINE_CHUNKSIZE))
+
+# ---------- Fused drivers ----------
+
+STAGES_DIR = Path(__file__).resolve().parent
+
+def load_stage(filename: str) -> ModuleType:
+    """
+    Import a stage script by file name (they start with digits). The module is
+    registered in sys.modules so a process pool can pickle its functions.
+    """
+    path = STAGES_DIR / filename
+    spec = importlib.util.spec_from_file_location(f"stage_{path.stem}", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def apply_per_sentence(text: str, transforms: Sequence[Callable[[str], str]]) -> str:
+    """
+    Split `text` as the stages do (`text_sep`) and run every transform on each
+    non-blank block, stripping it before each one.
+    """
+    sep = text_sep(text)
+    parts = text.split(sep)
+    for i, part in enumerate(parts):
+        for transform in transforms:
+            blk = part.strip()
+            if blk:
+                part = transform(blk)
+        parts[i] = part
+    return sep.join(parts)
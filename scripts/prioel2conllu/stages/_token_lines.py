@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Shared byte-line helpers for stages 06 and 07.
+
+PURPOSE
+    Both stages read token lines as raw UTF-8 bytes, classify every line once
+    (sentence open/close, token without head-id) and attach the tokens they
+    insert to the nearest orphan token of the sentence. The patterns, the
+    classification and the orphan search live here so the two stages (and the
+    fused 06–09 driver) share one implementation.
+
+USAGE
+    A stage run by path has this directory as sys.path[0], so it imports the
+    module by name:
+        from _token_lines import classify_line, find_nearest_orphan_token
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Optional
+
+# --- Regexes ------------------------------------------------------------------
+# Lines are scanned as raw UTF-8 bytes: every pattern below is pure ASCII, so
+# only the values copied into newly emitted tokens ever need decoding.
+
+TOKEN_ID_RE         = re.compile(rb'\btoken\s+id="([^"]+)"')
+HEAD_ID_RE          = re.compile(rb'\bhead-id="([^"]+)"')
+PRESENT_AFTER_RE    = re.compile(rb'\bpresentation-after="([^"]*)"')
+SENTENCE_OPEN_RE    = re.compile(rb'<\s*sentence\b')
+SENTENCE_CLOSE_RE   = re.compile(rb'</\s*sentence\s*>')
+TOKEN_LINE_RE       = re.compile(rb'<\s*token\b[^>]*?/?>')  # tolerant: <token ... /> or <token ...>
+PRESENT_AFTER_KEY   = b'presentation-after="'
+
+# --- Small helpers ------------------------------------------------------------
+
+def get_attr(line: bytes, regex: re.Pattern[bytes]) -> Optional[bytes]:
+    m = regex.search(line)
+    return m.group(1) if m else None
+
+def has_attr(line: bytes, regex: re.Pattern[bytes]) -> bool:
+    return bool(regex.search(line))
+
+def leading_indent(line: bytes) -> bytes:
+    return line[: len(line) - len(line.lstrip())]
+
+def is_sentence_open(line: bytes) -> bool:
+    return bool(SENTENCE_OPEN_RE.search(line))
+
+def is_sentence_close(line: bytes) -> bool:
+    return bool(SENTENCE_CLOSE_RE.search(line))
+
+def is_token_line(line: bytes) -> bool:
+    return bool(TOKEN_LINE_RE.search(line))
+
+# --- Line classification ------------------------------------------------------
+# Each line is classified once per file into bit flags so the orphan search
+# compares ints instead of re-running regex probes on every step.
+
+LINE_SENT_OPEN  = 1
+LINE_SENT_CLOSE = 2
+LINE_ORPHAN     = 4   # token line without head-id
+
+def classify_line(line: bytes) -> int:
+    """
+    Return the LINE_* flags of `line`. Lines holding a single tag are decided
+    from their leading tag; anything else goes through the regex probes.
+    """
+    if line.count(b"<") == 1:
+        s = line.lstrip()
+        if s.startswith(b"<token ") and b">" in s:
+            return 0 if has_attr(line, HEAD_ID_RE) else LINE_ORPHAN
+        if s.startswith((b"<sentence ", b"<sentence>")):
+            return LINE_SENT_OPEN
+        if s.startswith(b"</sentence>"):
+            return LINE_SENT_CLOSE
+    flags = 0
+    if is_sentence_open(line):
+        flags |= LINE_SENT_OPEN
+    if is_sentence_close(line):
+        flags |= LINE_SENT_CLOSE
+    if is_token_line(line) and not has_attr(line, HEAD_ID_RE):
+        flags |= LINE_ORPHAN
+    return flags
+
+# --- Orphan search ------------------------------------------------------------
+
+def find_nearest_orphan_token(classes: list[int], idx: int) -> Optional[int]:
+    """
+    Find the nearest token line to `idx` within the same sentence that has NO head-id.
+    Search backwards first (until <sentence ...>), then forwards (until </sentence>).
+    If both sides are candidates at equal distance, prefer the previous one.
+    Return the line index, or None if not found.
+    """
+    # Search backwards to sentence open
+    prev_idx: Optional[int] = None
+    for j in range(idx - 1, -1, -1):
+        if classes[j] & LINE_SENT_OPEN:
+            break
+        if classes[j] & LINE_ORPHAN:
+            prev_idx = j
+            break
+
+    # Search forwards to sentence close
+    next_idx: Optional[int] = None
+    for j in range(idx + 1, len(classes)):
+        if classes[j] & LINE_SENT_CLOSE:
+            break
+        if classes[j] & LINE_ORPHAN:
+            next_idx = j
+            break
+
+    # Decide: prefer previous if equally close (or if only previous exists)
+    if prev_idx is not None and next_idx is not None:
+        if (idx - prev_idx) <= (next_idx - idx):
+            return prev_idx
+        return next_idx
+    return prev_idx if prev_idx is not None else next_idx
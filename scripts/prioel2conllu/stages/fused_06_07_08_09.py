@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stages 06–09 fused — run punctuation/question insertion, POS/FEAT mapping and
+morphology expansion in a single streaming pass.
+
+PURPOSE
+    Produce exactly what running 06 → 07 → 08 → 09 one after another produces,
+    without writing and re-reading three intermediate files. The stage scripts
+    stay the source of truth: their in-memory entry points are loaded and chained
+    here (`process_lines` for 06/07, `transform_line` for 08/09).
+
+    Input is streamed in sentence blocks. The orphan-head search of 06/07 looks
+    back to the nearest <sentence> line and ahead to the nearest </sentence>
+    line, so a block is only cut between a </sentence> line and the next
+    <sentence> line when none of the lines from one to the other (both
+    included) has a presentation-after to act on. A token sharing a line with
+    </sentence> can thus still reach an orphan in the next sentence, exactly
+    as in the sequential run. Blocks are also only cut after a "\\n", so 08/09
+    see the same lines they would read from 07's output.
+
+CLI
+    python scripts/prioel2conllu/stages/fused_06_07_08_09.py \
+        --in input.txt --out output.txt
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+from typing import Iterable, Iterator, List
+
+from _stage_io import IO_BUFFER_SIZE, MappedLines, load_stage, mapped_lines
+from _token_lines import LINE_SENT_CLOSE, LINE_SENT_OPEN, PRESENT_AFTER_KEY, classify_line
+
+_s06 = load_stage("06_infer_punct_from_presentation_after.py")
+_s07 = load_stage("07_handle_question_presentation_after.py")
+_s08 = load_stage("08_pos_and_feat_mapping.py")
+_s09 = load_stage("09_morphology_codes_to_feats.py")
+
+# ---------- Streaming ----------
+
+def iter_sentence_blocks(lines: Iterable[bytes]) -> Iterator[List[bytes]]:
+    """
+    Group lines into blocks that 06/07 can process independently: each cut
+    falls after a "\\n"-terminated </sentence> line and before the next
+    <sentence> line, and no line in between (both ends included) carries
+    presentation-after. The last block may end anywhere.
+    """
+    block: List[bytes] = []
+    cut = -1   # length of the block up to a pending cut, or -1
+    for line in lines:
+        flags = classify_line(line)
+        if cut >= 0:
+            if PRESENT_AFTER_KEY in line:
+                cut = -1
+            elif flags & LINE_SENT_OPEN:
+                yield block[:cut]
+                block = block[cut:]
+                cut = -1
+        block.append(line)
+        if cut < 0 and flags & LINE_SENT_CLOSE and line.endswith(b"\n") and PRESENT_AFTER_KEY not in line:
+            cut = len(block)
+    if block:
+        yield block
+
+def process(lines_iter: Iterable[bytes]) -> Iterator[str]:
+    """Yield the stage-09 output lines (newline-terminated) for raw input lines."""
+    transform_08 = _s08.transform_line
+    transform_09 = _s09.transform_line
+    for block in iter_sentence_blocks(lines_iter):
+        # 07 re-reads 06's output as lines: a last line without a line break
+        # runs into the punctuation line 06 appends to it
+        block = _s07.process_lines(MappedLines(b"".join(_s06.process_lines(block))))
+        # 08 reads 07's output in text mode, so its lines end at "\n" only
+        pieces = b"".join(block).decode("utf-8").split("\n")
+        if not pieces[-1]:
+            pieces.pop()
+        for piece in pieces:
+            yield transform_09(transform_08(piece)) + "\n"
+
+# ---------- File I/O & CLI ----------
+
+WRITE_BATCH = 4096   # lines per writelines() call
+
+def process_file(input_path: Path, output_path: Path) -> None:
+    with mapped_lines(input_path) as lines, \
+         output_path.open("w", encoding="utf-8", buffering=IO_BUFFER_SIZE) as outfile:
+        batch: List[str] = []
+        for out in process(lines):
+            batch.append(out)
+            if len(batch) >= WRITE_BATCH:
+                outfile.writelines(batch)
+                batch.clear()
+        outfile.writelines(batch)
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Stages 06–09 in one pass (punctuation, questions, POS/FEAT, morphology).")
+    ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
+    ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
+    args = ap.parse_args()
+    process_file(args.inp, args.out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stages 10–14 fused — fold morphology into FEAT and rewire coordination, SCONJ
+and ADP/DET in one process, reading and writing the file once.
+
+PURPOSE
+    Produce exactly what running the stage scripts one after another produces,
+    reading the input once and writing the output once. The stage scripts stay
+    the source of truth: each one's in-memory entry point (`process_text`) is
+    loaded and chained here, so the standalone CLIs keep working unchanged.
+
+NOTES
+    - The text is handed from stage to stage as a single string rather than
+      streamed per sentence: stages 11/12 drop the </sentence> delimiter they
+      split on, and stage 14 collects its fixed-token set over the whole file,
+      so a per-sentence stream would not reproduce the sequential output.
+
+CLI
+    python scripts/prioel2conllu/stages/fused_10_14.py \
+        --in input.txt --out output.txt
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+from typing import Callable, List
+
+from _stage_io import load_stage
+
+# Stage scripts chained by process_text, in order
+STAGES = (
+    "10_fold_morphology_into_feat.py",
+    "11_rewire_coordination_cconj.py",
+    "12_remove_empty_c_tokens.py",
+    "13_rewire_sconj_mark.py",
+    "14_rewire_adp_case_and_z_det.py",
+)
+
+_TRANSFORMS: List[Callable[[str], str]] = [load_stage(name).process_text for name in STAGES]
+
+# ---------- Pipeline ----------
+
+def process_text(text: str) -> str:
+    """Run every stage's text transform in order."""
+    for transform in _TRANSFORMS:
+        text = transform(text)
+    return text
+
+# ---------- File I/O & CLI ----------
+
+def process_file(input_path: Path, output_path: Path) -> None:
+    text = input_path.read_text(encoding="utf-8")
+    output_path.write_text(process_text(text), encoding="utf-8")
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Run stages 10–14 in one pass.")
+    ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
+    ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
+    args = ap.parse_args()
+    process_file(args.inp, args.out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stages 15–21 fused — run the mi#2/AUX/parpred/vocative/infinitive rewrites and
+the relation normalization in one process, reading and writing the file once.
+
+PURPOSE
+    Produce exactly what running 15 → 16 → … → 21 one after another produces,
+    without six intermediate files. The stage scripts stay the source of truth:
+    their in-memory entry points are loaded and chained here.
+
+NOTES
+    - Stages 16–19 split the text into sentence blocks the same way, and none of
+      them adds or removes a </sentence> delimiter, so the text is split once
+      and each block goes through all four `process_sentence` transforms before
+      the next block is touched.
+    - Stages 15 and 20 are line-based (15 resets its state on any line holding
+      </sentence>, 20 sees lines that can straddle two blocks once 16 has
+      stripped them), so they run over the whole text, as does 21 after 20.
+
+CLI
+    python scripts/prioel2conllu/stages/fused_15_21.py \
+        --in input.txt --out output.txt [--verbose]
+"""
+
+from __future__ import annotations
+
+import argparse
+from functools import partial
+from pathlib import Path
+
+from _stage_io import apply_per_sentence, load_stage
+
+_s15 = load_stage("15_mi2_after_head_to_det.py")
+_s16 = load_stage("16_rewire_aux_with_xadv_xobj.py")
+_s17 = load_stage("17_attach_parpred_to_pred.py")
+_s18 = load_stage("18_attach_vocatives.py")
+_s19 = load_stage("19_infinitive_with_case_to_vnoun.py")
+_s20 = load_stage("20_normalize_relations_and_isk.py")
+_s21 = load_stage("21_parpred_to_ccomp_or_parataxis.py")
+
+# ---------- Pipeline ----------
+
+def process_text(text: str, verbose: bool = False) -> str:
+    """Run stages 15–21 on a whole file's text in memory."""
+    text = _s15.process_text(text, verbose=verbose)
+    text = apply_per_sentence(text, (
+        _s16.process_sentence,
+        _s17.process_sentence,
+        _s18.process_sentence,
+        _s19.process_sentence,
+    ))
+    text = _s20.process_text(text)
+    return apply_per_sentence(text, (partial(_s21.process_sentence, verbose=verbose),))
+
+# ---------- File I/O & CLI ----------
+
+def process_file(input_path: Path, output_path: Path, verbose: bool = False) -> None:
+    text = input_path.read_text(encoding="utf-8")
+    output_path.write_text(process_text(text, verbose=verbose), encoding="utf-8")
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Stages 15–21 in one pass (mi#2, AUX, parpred, vocatives, Vnoun, relations).")
+    ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
+    ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
+    ap.add_argument("--verbose", action="store_true", help="Print debug messages")
+    args = ap.parse_args()
+    process_file(args.inp, args.out, verbose=args.verbose)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stages 22–28 fused — refine adv/atr/apos/aux/comp/narg/obj relations in one
+process, reading and writing the file once.
+
+PURPOSE
+    Produce exactly what running 22 → 23 → … → 28 one after another produces,
+    without six intermediate files. The stage scripts stay the source of truth:
+    their rule functions are loaded and chained here.
+
+NOTES
+    - No stage's output relation is another stage's input relation, so each
+      token is rewritten by at most one of them. Order only matters where a rule
+      reads other tokens: 23 reads the head's relation (22 can turn adv into
+      mark) and 24 reads its dependents' relations.
+    - So 22 runs first over the whole text, then the text is split into sentence
+      blocks for 23 and 24, and 25–28 run last in one line pass that hands
+      each candidate line to the refiner for its relation.
+    - With --verbose, 25–28 report in line order rather than stage by stage.
+
+CLI
+    python scripts/prioel2conllu/stages/fused_22_28.py \
+        --in input.txt --out output.txt [--verbose]
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from _stage_io import apply_per_sentence, load_stage
+
+_s22 = load_stage("22_refine_adv_relations.py")
+_s23 = load_stage("23_refine_atr_relations.py")
+_s24 = load_stage("24_refine_apos_relations.py")
+_s25 = load_stage("25_refine_aux_relations.py")
+_s26 = load_stage("26_refine_comp_relations.py")
+_s27 = load_stage("27_refine_narg_relations.py")
+_s28 = load_stage("28_refine_obj_relations.py")
+
+# Line refiners of stages 25–28, keyed by the relation each one rewrites
+LINE_REFINERS: Dict[str, Callable[..., str]] = {
+    "aux":  _s25.refine_aux_relation,
+    "comp": _s26.refine_comp_relation,
+    "narg": _s27.refine_narg_relation,
+    "obj":  _s28.refine_obj_relation,
+}
+LINE_TARGET_RE = re.compile(r'relation="(?:aux|comp|narg|obj)"')
+
+# ---------- Pipeline ----------
+
+def refine_lines(text: str, verbose: bool = False) -> str:
+    """
+    Stages 25–28 in one pass: jump from one candidate line to the next and
+    rewrite it with the refiner for its (first) relation, if it has one.
+    """
+    out: List[str] = []
+    pos = 0
+    while True:
+        m = LINE_TARGET_RE.search(text, pos)
+        if m is None:
+            break
+        start = text.rfind("\n", 0, m.start()) + 1
+        end = text.find("\n", m.start())
+        if end < 0:
+            end = len(text)
+        line = text[start:end]
+        refine = LINE_REFINERS.get(_s25.get_attr(line, "relation"))
+        out.append(text[pos:start])
+        out.append(refine(line, verbose=verbose) if refine else line)
+        pos = end
+    out.append(text[pos:])
+    return "".join(out)
+
+def process_text(text: str, verbose: bool = False) -> str:
+    """Run stages 22–28 on a whole file's text in memory."""
+    text = _s22.process_text(text, verbose=verbose)
+    # 23 over every sentence, then 24, so --verbose reports stage by stage
+    for stage in (_s23, _s24):
+        text = apply_per_sentence(text, (partial(stage.process_sentence, verbose=verbose),))
+    return refine_lines(text, verbose=verbose)
+
+# ---------- File I/O & CLI ----------
+
+def process_file(input_path: Path, output_path: Path, verbose: bool = False) -> None:
+    text = input_path.read_text(encoding="utf-8")
+    output_path.write_text(process_text(text, verbose=verbose), encoding="utf-8")
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Stages 22–28 in one pass (adv, atr, apos, aux, comp, narg, obj).")
+    ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
+    ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
+    ap.add_argument("--verbose", action="store_true", help="Print decision logs")
+    args = ap.parse_args()
+    process_file(args.inp, args.out, verbose=args.verbose)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stages 29–34 fused — refine obl/part/sub/voc/xadv relations and mark passive
+subjects in one process, reading and writing the file once.
+
+PURPOSE
+    Produce exactly what running 29 → 30 → … → 34 one after another produces,
+    without five intermediate files. The stage scripts stay the source of truth:
+    their rule functions are loaded and chained here.
+
+NOTES
+    - Stages 29–33 each rewrite one relation (obl, part, sub, voc, xadv) into
+      labels none of the others looks for, so each token is rewritten by at
+      most one of them. 34 reads the nsubj/csubj that 31 can write, so it runs
+      after 31 on every sentence.
+    - The text is split into sentence blocks once, and each block goes through
+      29, 30, 31, 33 and 34 before the next block is touched. Every stage skips
+      a block without its target relation before parsing it.
+    - 32 is line-based and reads nothing the others write. It runs last over
+      the whole text, on the lines the sentence split has already reshaped, as
+      it would after 29–31.
+    - With --verbose, messages come sentence by sentence rather than stage by
+      stage, and 32's come last.
+
+CLI
+    python scripts/prioel2conllu/stages/fused_29_34.py \
+        --in input.txt --out output.txt [--verbose]
+"""
+
+from __future__ import annotations
+
+import argparse
+from functools import partial
+from pathlib import Path
+
+from _stage_io import apply_per_sentence, load_stage
+
+_s29 = load_stage("29_refine_obl_relations.py")
+_s30 = load_stage("30_refine_part_relations.py")
+_s31 = load_stage("31_refine_sub_relations.py")
+_s32 = load_stage("32_refine_voc_relation.py")
+_s33 = load_stage("33_refine_xadv_relations.py")
+_s34 = load_stage("34_mark_passive_subjects.py")
+
+# ---------- Pipeline ----------
+
+def process_text(text: str, verbose: bool = False) -> str:
+    """Run stages 29–34 on a whole file's text in memory."""
+    text = apply_per_sentence(text, tuple(
+        partial(stage.process_sentence, verbose=verbose)
+        for stage in (_s29, _s30, _s31, _s33, _s34)
+    ))
+    return _s32.process_text(text, verbose=verbose)
+
+# ---------- File I/O & CLI ----------
+
+def process_file(input_path: Path, output_path: Path, verbose: bool = False) -> None:
+    text = input_path.read_text(encoding="utf-8")
+    output_path.write_text(process_text(text, verbose=verbose), encoding="utf-8")
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Stages 29–34 in one pass (obl, part, sub, voc, xadv, passive subjects).")
+    ap.add_argument("--in", dest="inp", required=True, type=Path, help="Input text path")
+    ap.add_argument("--out", dest="out", required=True, type=Path, help="Output text path")
+    ap.add_argument("--verbose", action="store_true", help="Print decision logs")
+    args = ap.parse_args()
+    process_file(args.inp, args.out, verbose=args.verbose)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Differential tests for the fused drivers and the --jobs option.
+
+Every fused driver must write exactly what its stages write when run one
+after another, and a stage run with --jobs N must write what it writes with
+--jobs 1. The inputs are generated sentence files, including the awkward
+shapes: </sentence> on a token line, CRLF line endings, a vertical tab, and
+no trailing newline.
+
+Run with:  python -m pytest scripts/prioel2conllu/tests
+"""
+
+from __future__ import annotations
+
+import inspect
+import random
+import sys
+from pathlib import Path
+from typing import List
+
+import pytest
+
+STAGES_DIR = Path(__file__).resolve().parents[1] / "stages"
+sys.path.insert(0, str(STAGES_DIR))
+
+from _stage_io import load_stage  # noqa: E402
+
+# ---------- Generated input ----------
+
+POS = ["A-", "C-", "Df", "Du", "G-", "Ne", "Nb", "Pd", "Pi", "Pp", "Pr", "R-", "V-",
+       "ADJ", "ADP", "ADV", "AUX", "CCONJ", "SCONJ", "DET", "NOUN", "PRON", "VERB", "_"]
+RELATIONS = ["adv", "atr", "apos", "aux", "comp", "narg", "obj", "obl", "part", "sub",
+             "voc", "xadv", "xobj", "pred", "parpred", "punct", "cc", "conj", "case",
+             "det", "mark", "ag", "rel", "nmod", "fixed", "_"]
+LEMMAS = ["asem", "anown", "isk", "z", "mi#2", "miay", "om", "ays#1", "ew", "ibrew",
+          "kan", "tʻē", "linim", "mard"]
+MORPHOLOGY = ["3spia----i", "-s---mn--i", "--pna----i", "3spip----i", "-p---fa--i",
+              "--------n", "_", "-s---nd--i", "--nn-----i"]
+FEATS = ["_", "Case=Nom", "Case=Acc|Number=Sing", "VerbForm=Inf", "VerbForm=Vnoun|Case=Dat",
+         "PronType=Rel", "VerbForm=Fin|Voice=Pass", "VerbForm=Part|Voice=Act"]
+PRESENTATION_AFTER = [None, None, " ", ", ", ".", "?", "?: ", "·", ":", "՝", ""]
+FORMS = ["ew", "Yisus", "asē", "zna", "mardkan", "tʻē", "kʻo"]
+
+def token_line(rng: random.Random, tid: int, n: int) -> str:
+    attrs = [f'id="{tid}"']
+    empty = rng.random() < 0.12
+    if empty:
+        attrs.append(f'empty-token-sort="{rng.choice("VCP")}"')
+    else:
+        attrs.append(f'form="{rng.choice(FORMS)}"')
+        attrs.append(f'lemma="{rng.choice(LEMMAS)}"')
+        attrs.append(f'part-of-speech="{rng.choice(POS)}"')
+        if rng.random() < 0.7:
+            attrs.append(f'morphology="{rng.choice(MORPHOLOGY)}"')
+        if rng.random() < 0.6:
+            attrs.append(f'FEAT="{rng.choice(FEATS)}"')
+    if rng.random() < 0.8:
+        attrs.append(f'head-id="{rng.randint(1, n)}"')
+    attrs.append(f'relation="{rng.choice(RELATIONS)}"')
+    after = rng.choice(PRESENTATION_AFTER)
+    if after is not None and not empty:
+        attrs.append(f'presentation-after="{after}"')
+    return "      <token " + " ".join(attrs) + " />"
+
+def generate(seed: int) -> str:
+    """A small sentence file; the seed also picks the line-ending quirks."""
+    rng = random.Random(seed)
+    lines: List[str] = []
+    for sid in range(1, rng.randint(2, 10)):
+        n = rng.randint(1, 9)
+        lines.append(f'    <sentence id="{sid}" status="annotated">')
+        lines.extend(token_line(rng, k + 1, n) for k in range(n))
+        if rng.random() < 0.3:
+            lines[-1] += "</sentence>"
+        else:
+            lines.append("    </sentence>")
+    text = "\n".join(lines) + "\n"
+    if seed % 4 == 1:
+        text = text.replace("\n", "\r\n")
+    if seed % 5 == 2:
+        text = text.replace(" />\n", " />\x0b\n", 1)
+    if seed % 3 == 0:
+        text = text.rstrip("\r\n")
+    return text
+
+SEEDS = range(40)
+
+@pytest.fixture(scope="module", params=SEEDS)
+def input_file(request, tmp_path_factory) -> Path:
+    path = tmp_path_factory.mktemp(f"in{request.param}") / "input.txt"
+    path.write_bytes(generate(request.param).encode("utf-8"))
+    return path
+
+# ---------- Fused drivers vs the sequential chain ----------
+
+def stage_files(first: int, last: int) -> List[str]:
+    return sorted(p.name for p in STAGES_DIR.glob("[0-9][0-9]_*.py")
+                  if first <= int(p.name[:2]) <= last)
+
+DRIVERS = {
+    "fused_06_07_08_09.py": (6, 9),
+    "fused_10_14.py": (10, 14),
+    "fused_15_21.py": (15, 21),
+    "fused_22_28.py": (22, 28),
+    "fused_29_34.py": (29, 34),
+}
+
+@pytest.mark.parametrize("driver", sorted(DRIVERS))
+def test_fused_driver_matches_sequential_stages(driver: str, input_file: Path, tmp_path: Path) -> None:
+    current = input_file
+    for k, name in enumerate(stage_files(*DRIVERS[driver])):
+        output = tmp_path / f"stage{k}.txt"
+        load_stage(name).process_file(current, output)
+        current = output
+    fused_output = tmp_path / "fused.txt"
+    load_stage(driver).process_file(input_file, fused_output)
+    assert fused_output.read_bytes() == current.read_bytes()
+
+# ---------- --jobs N vs --jobs 1 ----------
+
+PARALLEL_STAGES = [name for name in stage_files(6, 34)
+                   if "jobs" in inspect.signature(load_stage(name).process_file).parameters]
+
+@pytest.mark.parametrize("stage", PARALLEL_STAGES)
+def test_jobs_match_serial_output(stage: str, input_file: Path, tmp_path: Path, capsys) -> None:
+    module = load_stage(stage)
+    verbose = {"verbose": True} if "verbose" in inspect.signature(module.process_file).parameters else {}
+    outputs = []
+    for jobs in (1, 3):
+        output = tmp_path / f"jobs{jobs}.txt"
+        module.process_file(input_file, output, jobs=jobs, **verbose)
+        outputs.append((output.read_bytes(), capsys.readouterr().out))
+    assert outputs[0] == outputs[1]